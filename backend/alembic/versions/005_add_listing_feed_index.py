@@ -0,0 +1,35 @@
+"""Add keyset pagination index for the listings feed
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Keyset comparisons on (is_featured, created_at, id) need a non-null flag
+    op.execute("UPDATE listings SET is_featured = false WHERE is_featured IS NULL")
+    op.alter_column('listings', 'is_featured', nullable=False, server_default=sa.false())
+
+    # Matches GET /listings ordering: featured first, newest first, id as tiebreaker
+    op.create_index(
+        'ix_listings_active_feed',
+        'listings',
+        [sa.text('is_featured DESC'), sa.text('created_at DESC'), sa.text('id DESC')],
+        postgresql_where=sa.text("status = 'ACTIVE'"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_listings_active_feed', table_name='listings')
+    op.alter_column('listings', 'is_featured', nullable=True, server_default=None)
@@ -0,0 +1,46 @@
+"""Add partial indexes for listing search filters
+
+Revision ID: 006
+Revises: 005
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '006'
+down_revision = '005'
+branch_labels = None
+depends_on = None
+
+ACTIVE = sa.text("status = 'ACTIVE'")
+
+
+def upgrade() -> None:
+    # GET /listings always filters status = 'ACTIVE', so every index is partial on it
+    op.create_index(
+        'ix_listings_active_server_feed',
+        'listings',
+        ['server_id', sa.text('is_featured DESC'), sa.text('created_at DESC'), sa.text('id DESC')],
+        postgresql_where=ACTIVE,
+    )
+    op.create_index(
+        'ix_listings_active_server_type_price',
+        'listings',
+        ['server_id', 'type', 'price'],
+        postgresql_where=ACTIVE,
+    )
+    op.create_index(
+        'ix_listings_active_seller_feed',
+        'listings',
+        ['seller_id', sa.text('is_featured DESC'), sa.text('created_at DESC'), sa.text('id DESC')],
+        postgresql_where=ACTIVE,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_listings_active_seller_feed', table_name='listings')
+    op.drop_index('ix_listings_active_server_type_price', table_name='listings')
+    op.drop_index('ix_listings_active_server_feed', table_name='listings')
@@ -0,0 +1,53 @@
+"""Add full-text and trigram search indexes for listings
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+ACTIVE = sa.text("status = 'ACTIVE'")
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    # Must stay identical to models.LISTING_SEARCH_DOCUMENT so the planner can match it
+    op.execute(
+        "CREATE INDEX ix_listings_active_search_document ON listings "
+        "USING gin (to_tsvector('simple', coalesce(description, '') || ' ' || chronicle)) "
+        "WHERE status = 'ACTIVE'"
+    )
+
+    # Trigram indexes keep substring (ILIKE '%...%') matches off sequential scans
+    op.create_index(
+        'ix_listings_active_description_trgm',
+        'listings',
+        ['description'],
+        postgresql_using='gin',
+        postgresql_ops={'description': 'gin_trgm_ops'},
+        postgresql_where=ACTIVE,
+    )
+    op.create_index(
+        'ix_listings_active_chronicle_trgm',
+        'listings',
+        ['chronicle'],
+        postgresql_using='gin',
+        postgresql_ops={'chronicle': 'gin_trgm_ops'},
+        postgresql_where=ACTIVE,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_listings_active_chronicle_trgm', table_name='listings')
+    op.drop_index('ix_listings_active_description_trgm', table_name='listings')
+    op.drop_index('ix_listings_active_search_document', table_name='listings')
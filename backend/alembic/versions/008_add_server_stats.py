@@ -0,0 +1,65 @@
+"""Add maintained per-server activity statistics
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '008'
+down_revision = '007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('server_stats',
+        sa.Column('server_id', sa.Integer(), nullable=False),
+        sa.Column('active_listings', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('total_transactions', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('total_sellers', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('activity_score', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['server_id'], ['servers.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('server_id')
+    )
+    op.create_index(op.f('ix_server_stats_activity_score'), 'server_stats', ['activity_score'], unique=False)
+
+    # Per-listing purchase counts are needed for every incremental refresh
+    op.create_index(op.f('ix_purchase_history_listing_id'), 'purchase_history', ['listing_id'], unique=False)
+
+    # Backfill from current data; the app keeps it up to date from here on
+    op.execute("""
+    INSERT INTO server_stats (server_id, active_listings, total_transactions, total_sellers, activity_score, updated_at)
+    SELECT s.id,
+           COALESCE(l.active_listings, 0),
+           COALESCE(p.total_transactions, 0),
+           COALESCE(l.total_sellers, 0),
+           COALESCE(l.active_listings, 0) + COALESCE(p.total_transactions, 0),
+           NOW()
+    FROM servers s
+    LEFT JOIN (
+        SELECT listings.server_id, COUNT(listings.id) AS active_listings, COUNT(DISTINCT listings.seller_id) AS total_sellers
+        FROM listings JOIN users ON users.id = listings.seller_id
+        WHERE listings.status = 'ACTIVE' AND users.is_verified
+        GROUP BY listings.server_id
+    ) l ON l.server_id = s.id
+    LEFT JOIN (
+        SELECT listings.server_id, COUNT(purchase_history.id) AS total_transactions
+        FROM purchase_history
+        JOIN listings ON listings.id = purchase_history.listing_id
+        JOIN users ON users.id = listings.seller_id
+        WHERE listings.status = 'ACTIVE' AND users.is_verified
+        GROUP BY listings.server_id
+    ) p ON p.server_id = s.id
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_purchase_history_listing_id'), table_name='purchase_history')
+    op.drop_index(op.f('ix_server_stats_activity_score'), table_name='server_stats')
+    op.drop_table('server_stats')
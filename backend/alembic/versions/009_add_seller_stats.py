@@ -0,0 +1,48 @@
+"""Add denormalized seller reputation counters
+
+Revision ID: 009
+Revises: 008
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '009'
+down_revision = '008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('seller_stats',
+        sa.Column('seller_id', sa.Integer(), nullable=False),
+        sa.Column('rating_sum', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('review_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('likes_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['seller_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('seller_id')
+    )
+
+    # Backfill from existing reviews and likes
+    op.execute("""
+    INSERT INTO seller_stats (seller_id, rating_sum, review_count, likes_count, updated_at)
+    SELECT u.id, COALESCE(r.rating_sum, 0), COALESCE(r.review_count, 0), COALESCE(l.likes_count, 0), NOW()
+    FROM users u
+    LEFT JOIN (
+        SELECT reviewee_id, SUM(rating) AS rating_sum, COUNT(*) AS review_count
+        FROM reviews GROUP BY reviewee_id
+    ) r ON r.reviewee_id = u.id
+    LEFT JOIN (
+        SELECT seller_id, COUNT(*) AS likes_count
+        FROM seller_likes GROUP BY seller_id
+    ) l ON l.seller_id = u.id
+    WHERE r.reviewee_id IS NOT NULL OR l.seller_id IS NOT NULL
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('seller_stats')
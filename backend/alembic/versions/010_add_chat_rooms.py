@@ -0,0 +1,60 @@
+"""Add chat_rooms index table
+
+Revision ID: 010
+Revises: 009
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '010'
+down_revision = '009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('chat_rooms',
+        sa.Column('room_id', sa.String(), nullable=False),
+        sa.Column('listing_id', sa.Integer(), nullable=True),
+        sa.Column('buyer_id', sa.Integer(), nullable=False),
+        sa.Column('seller_id', sa.Integer(), nullable=False),
+        sa.Column('last_message_id', sa.Integer(), nullable=True),
+        sa.Column('last_message_at', sa.DateTime(), nullable=True),
+        sa.Column('buyer_unread', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('seller_unread', sa.Integer(), nullable=False, server_default='0'),
+        sa.ForeignKeyConstraint(['listing_id'], ['listings.id'], ondelete='SET NULL'),
+        sa.ForeignKeyConstraint(['buyer_id'], ['users.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['seller_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('room_id')
+    )
+    op.create_index('ix_chat_rooms_buyer_recent', 'chat_rooms', ['buyer_id', sa.text('last_message_at DESC')])
+    op.create_index('ix_chat_rooms_seller_recent', 'chat_rooms', ['seller_id', sa.text('last_message_at DESC')])
+
+    # Backfill from existing "<listing>_<buyer>_<seller>" rooms
+    op.execute(r"""
+    INSERT INTO chat_rooms (room_id, listing_id, buyer_id, seller_id, last_message_id, last_message_at)
+    SELECT latest.room_id,
+           (SELECT id FROM listings WHERE id = split_part(latest.room_id, '_', 1)::int),
+           split_part(latest.room_id, '_', 2)::int,
+           split_part(latest.room_id, '_', 3)::int,
+           m.id,
+           m.created_at
+    FROM (
+        SELECT room_id, MAX(id) AS last_id FROM messages
+        WHERE room_id ~ '^\d+_\d+_\d+$'
+        GROUP BY room_id
+    ) latest
+    JOIN messages m ON m.id = latest.last_id
+    WHERE EXISTS (SELECT 1 FROM users WHERE id = split_part(latest.room_id, '_', 2)::int)
+      AND EXISTS (SELECT 1 FROM users WHERE id = split_part(latest.room_id, '_', 3)::int)
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_chat_rooms_seller_recent', table_name='chat_rooms')
+    op.drop_index('ix_chat_rooms_buyer_recent', table_name='chat_rooms')
+    op.drop_table('chat_rooms')
@@ -0,0 +1,25 @@
+"""Add (room_id, id) index for chat history
+
+Revision ID: 011
+Revises: 010
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '011'
+down_revision = '010'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # History pages and reconnect replays are range scans over one room ordered by id
+    op.create_index('ix_messages_room_id_id', 'messages', ['room_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_messages_room_id_id', table_name='messages')
@@ -0,0 +1,60 @@
+"""Add price_buckets OHLC table
+
+Revision ID: 012
+Revises: 011
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '012'
+down_revision = '011'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('price_buckets',
+        sa.Column('server_id', sa.Integer(), nullable=False),
+        sa.Column('type', sa.String(), nullable=False),
+        sa.Column('source', sa.String(), nullable=False),
+        sa.Column('resolution', sa.String(), nullable=False),
+        sa.Column('bucket_start', sa.DateTime(), nullable=False),
+        sa.Column('open', sa.Float(), nullable=False),
+        sa.Column('high', sa.Float(), nullable=False),
+        sa.Column('low', sa.Float(), nullable=False),
+        sa.Column('close', sa.Float(), nullable=False),
+        sa.Column('volume', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('events', sa.Integer(), nullable=False, server_default='0'),
+        sa.ForeignKeyConstraint(['server_id'], ['servers.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('server_id', 'type', 'source', 'resolution', 'bucket_start')
+    )
+
+    # Backfill from listing creation prices and purchases; earlier price edits were never recorded
+    for resolution, unit in (('1m', 'minute'), ('1h', 'hour'), ('1d', 'day')):
+        op.execute(f"""
+        INSERT INTO price_buckets (server_id, type, source, resolution, bucket_start, open, high, low, close, volume, events)
+        SELECT server_id, type, 'listing', '{resolution}', date_trunc('{unit}', created_at),
+               (array_agg(price ORDER BY created_at, id))[1], MAX(price), MIN(price),
+               (array_agg(price ORDER BY created_at DESC, id DESC))[1], SUM(quantity), COUNT(*)
+        FROM listings
+        WHERE server_id IS NOT NULL AND type IN ('BUY', 'SELL')
+        GROUP BY server_id, type, date_trunc('{unit}', created_at)
+        """)
+        op.execute(f"""
+        INSERT INTO price_buckets (server_id, type, source, resolution, bucket_start, open, high, low, close, volume, events)
+        SELECT l.server_id, l.type, 'trade', '{resolution}', date_trunc('{unit}', p.transaction_date),
+               (array_agg(l.price ORDER BY p.transaction_date, p.id))[1], MAX(l.price), MIN(l.price),
+               (array_agg(l.price ORDER BY p.transaction_date DESC, p.id DESC))[1], SUM(l.quantity), COUNT(*)
+        FROM purchase_history p
+        JOIN listings l ON l.id = p.listing_id
+        WHERE l.server_id IS NOT NULL AND l.type IN ('BUY', 'SELL') AND p.transaction_date IS NOT NULL
+        GROUP BY l.server_id, l.type, date_trunc('{unit}', p.transaction_date)
+        """)
+
+
+def downgrade() -> None:
+    op.drop_table('price_buckets')
@@ -0,0 +1,30 @@
+"""Add partial index for scheduled featured expiry
+
+Revision ID: 013
+Revises: 012
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '013'
+down_revision = '012'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # The expiry UPDATE only ever touches featured rows, so index just those
+    op.create_index(
+        'ix_listings_featured_expires_at',
+        'listings',
+        ['featured_expires_at'],
+        postgresql_where=sa.text('is_featured'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_listings_featured_expires_at', table_name='listings')
@@ -0,0 +1,40 @@
+"""Add per-server seller counts for incremental server statistics
+
+Revision ID: 014
+Revises: 013
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '014'
+down_revision = '013'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('server_seller_stats',
+        sa.Column('server_id', sa.Integer(), nullable=False),
+        sa.Column('seller_id', sa.Integer(), nullable=False),
+        sa.Column('active_listings', sa.Integer(), nullable=False, server_default='0'),
+        sa.ForeignKeyConstraint(['server_id'], ['servers.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['seller_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('server_id', 'seller_id')
+    )
+
+    # Backfill from current data; the app keeps it up to date from here on
+    op.execute("""
+    INSERT INTO server_seller_stats (server_id, seller_id, active_listings)
+    SELECT listings.server_id, listings.seller_id, COUNT(listings.id)
+    FROM listings JOIN users ON users.id = listings.seller_id
+    WHERE listings.status = 'ACTIVE' AND users.is_verified AND listings.server_id IS NOT NULL
+    GROUP BY listings.server_id, listings.seller_id
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('server_seller_stats')
@@ -0,0 +1,31 @@
+"""Add first/last event times to price_buckets
+
+Revision ID: 015
+Revises: 014
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '015'
+down_revision = '014'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('price_buckets', sa.Column('first_event_at', sa.DateTime(), nullable=True))
+    op.add_column('price_buckets', sa.Column('last_event_at', sa.DateTime(), nullable=True))
+
+    # Existing buckets keep their open (no event precedes bucket_start) and still take the next close
+    op.execute("UPDATE price_buckets SET first_event_at = bucket_start, last_event_at = bucket_start")
+    op.alter_column('price_buckets', 'first_event_at', nullable=False)
+    op.alter_column('price_buckets', 'last_event_at', nullable=False)
+
+
+def downgrade() -> None:
+    op.drop_column('price_buckets', 'last_event_at')
+    op.drop_column('price_buckets', 'first_event_at')
@@ -1,18 +1,33 @@
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from cache import TTLCache
+from database import get_async_db
 from models import User
+import asyncio
 import os
+import time
 
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# bcrypt worker pool: "thread" (bcrypt releases the GIL) or "process"
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "thread")
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+
+# Authenticated principals are cached per process; other workers see changes after the TTL
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
@@ -22,6 +37,156 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+class PasswordHasher:
+    """Runs bcrypt on a bounded worker pool so hashing never blocks the event loop."""
+
+    def __init__(self, executor: str, workers: int, max_pending: int):
+        if executor == "process":
+            self._executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self.executor = executor
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    async def _run(self, fn, *args):
+        # Shed load instead of queueing unboundedly behind a login burst
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Authentication service busy, try again shortly",
+                headers={"Retry-After": "1"},
+            )
+        self.pending += 1
+        start = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.pending -= 1
+            self.completed += 1
+            self.total_seconds += elapsed
+            self.max_seconds = max(self.max_seconds, elapsed)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(get_password_hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(verify_password, plain_password, hashed_password)
+
+    def stats(self) -> dict:
+        return {
+            "executor": self.executor,
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_seconds": self.total_seconds / self.completed if self.completed else 0.0,
+            "max_seconds": self.max_seconds,
+        }
+
+password_hasher = PasswordHasher(PASSWORD_HASH_EXECUTOR, PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING)
+
+@dataclass(frozen=True)
+class Principal:
+    """Read-only view of the authenticated user, safe to share across requests."""
+    id: int
+    email: str
+    username: str
+    is_verified: bool
+    is_admin: bool
+    language: str
+    created_at: datetime
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(
+            id=user.id,
+            email=user.email,
+            username=user.username,
+            is_verified=bool(user.is_verified),
+            is_admin=bool(user.is_admin),
+            language=user.language or "en",
+            created_at=user.created_at,
+        )
+
+    @classmethod
+    def from_claims(cls, payload: dict) -> "Principal":
+        return cls(
+            id=payload["uid"],
+            email=payload["sub"],
+            username=payload["username"],
+            is_verified=bool(payload["is_verified"]),
+            is_admin=bool(payload["is_admin"]),
+            language=payload["language"],
+            created_at=datetime.fromisoformat(payload["created_at"]),
+        )
+
+principal_cache = TTLCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL)
+# When each user's row last changed here; claims in tokens issued before that are stale
+claims_changed_at = TTLCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL)
+
+def invalidate_principal(user_id: int):
+    principal_cache.invalidate(user_id)
+    claims_changed_at.set(user_id, time.time())
+
+def token_claims(user: User) -> dict:
+    return {
+        "sub": user.email,
+        "uid": user.id,
+        "iat": int(time.time()),
+        "username": user.username,
+        "is_verified": bool(user.is_verified),
+        "is_admin": bool(user.is_admin),
+        "language": user.language or "en",
+        "created_at": user.created_at.isoformat() if user.created_at else None,
+    }
+
+def principal_from_claims(payload: dict) -> Optional[Principal]:
+    """Principal carried by the token, if its claims are recent enough to trust.
+
+    Claims are trusted for PRINCIPAL_CACHE_TTL after issue (the staleness the cache already
+    allows across workers), and not at all once this process saw the user change since.
+    """
+    issued_at = payload.get("iat")
+    if issued_at is None or time.time() - issued_at > PRINCIPAL_CACHE_TTL:
+        return None
+    changed_at = claims_changed_at.get(payload["uid"])
+    if changed_at is not None and issued_at <= changed_at:
+        return None
+    try:
+        return Principal.from_claims(payload)
+    except (KeyError, TypeError, ValueError):
+        # Tokens issued before these claims existed
+        return None
+
+async def resolve_principal(payload: dict, db: AsyncSession) -> Optional[Principal]:
+    user_id = payload.get("uid")
+    if user_id is not None:
+        # Cached principal first (it reflects invalidations), then the token's own claims
+        principal = principal_cache.get(user_id) or principal_from_claims(payload)
+        if principal is not None:
+            return principal
+        user = await db.get(User, user_id)
+    else:
+        # Tokens issued before the uid claim existed
+        email = payload.get("sub")
+        if email is None:
+            return None
+        user = await db.scalar(select(User).where(User.email == email))
+    if user is None:
+        return None
+    principal = Principal.from_user(user)
+    principal_cache.set(user.id, principal)
+    return principal
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -32,15 +197,15 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def authenticate_user(db: Session, email: str, password: str):
-    user = db.query(User).filter(User.email == email).first()
+async def authenticate_user(db: AsyncSession, email: str, password: str):
+    user = await db.scalar(select(User).where(User.email == email))
     if not user:
         return False
-    if not verify_password(password, user.password_hash):
+    if not await password_hasher.verify(password, user.password_hash):
         return False
     return user
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -48,12 +213,9 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     )
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
     except JWTError:
         raise credentials_exception
-    user = db.query(User).filter(User.email == email).first()
-    if user is None:
+    principal = await resolve_principal(payload, db)
+    if principal is None:
         raise credentials_exception
-    return user
\ No newline at end of file
+    return principal
\ No newline at end of file
@@ -0,0 +1,100 @@
+"""Chat fan-out benchmark with slow consumers.
+
+Publishes messages into one room holding fast clients plus a few slow or
+stalled ones, and reports delivery latency at the fast clients for the
+old sequential broadcast loop and for ConnectionManager's queued fan-out.
+
+    cd backend && python -m benchmarks.bench_broadcast --fast 200 --slow 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+
+from benchmarks.common import default_database_url, summarize, emit
+
+class FastSocket:
+    def __init__(self, latencies: list):
+        self.latencies = latencies
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message: str):
+        self.latencies.append(time.perf_counter() - json.loads(message)["sent_at"])
+
+    async def close(self, code: int = 1000):
+        pass
+
+class SlowSocket(FastSocket):
+    def __init__(self, delay: float):
+        super().__init__([])
+        self.delay = delay
+
+    async def send_text(self, message: str):
+        await asyncio.sleep(self.delay)
+
+async def sequential_broadcast(sockets, message):
+    # The pre-queue ConnectionManager.broadcast loop
+    for socket in sockets:
+        await socket.send_text(message)
+
+async def run_mode(mode: str, args) -> dict:
+    from chat import ConnectionManager
+
+    latencies = []
+    sockets = [FastSocket(latencies) for _ in range(args.fast)]
+    sockets += [SlowSocket(args.slow_delay) for _ in range(args.slow)]
+    # Slow clients sit anywhere in the room, not conveniently at the end
+    random.Random(args.seed).shuffle(sockets)
+    manager = ConnectionManager(send_queue_size=args.queue_size, send_timeout=args.send_timeout)
+    await manager.start()
+    for socket in sockets:
+        await manager.connect(socket, "bench_room")
+
+    start = time.perf_counter()
+    for i in range(args.messages):
+        message = json.dumps({"id": i, "content": "x" * 64, "sent_at": time.perf_counter()})
+        if mode == "sequential":
+            await sequential_broadcast(sockets, message)
+        else:
+            await manager.broadcast(message, "bench_room")
+        await asyncio.sleep(args.interval)
+    # Let writer tasks drain what is still queued
+    deadline = time.perf_counter() + args.send_timeout + 1
+    while len(latencies) < args.fast * args.messages and time.perf_counter() < deadline:
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - start
+    result = summarize(latencies, elapsed, delivered=len(latencies), expected=args.fast * args.messages)
+    if mode == "queued":
+        result.update(evicted_slow=manager.evicted_slow, evicted_failed=manager.evicted_failed)
+    await manager.stop()
+    return result
+
+async def run(args):
+    results = {"benchmark": "chat_broadcast", "fast": args.fast, "slow": args.slow, "messages": args.messages}
+    for mode in args.modes:
+        results[mode] = await run_mode(mode, args)
+    emit(results, args.output)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fast", type=int, default=200)
+    parser.add_argument("--slow", type=int, default=5)
+    parser.add_argument("--slow-delay", type=float, default=0.2)
+    parser.add_argument("--messages", type=int, default=50)
+    parser.add_argument("--interval", type=float, default=0.01)
+    parser.add_argument("--queue-size", type=int, default=10)
+    parser.add_argument("--send-timeout", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--modes", nargs="+", default=["sequential", "queued"], choices=["sequential", "queued"])
+    parser.add_argument("--output")
+    args = parser.parse_args()
+    # chat imports database, which builds its engines at import time; no queries are issued
+    os.environ.setdefault("DATABASE_URL", default_database_url())
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""List endpoint CPU benchmark.
+
+Compares the two ways of serving a page of 100 rows: loading ORM entities
+and validating them with from_attributes, versus selecting only the response
+schema's columns and validating plain row dicts (what the list endpoints
+do). Both strategies run the same query shape on the same session setup and
+are measured in CPU time per page. The endpoints themselves are then timed
+over HTTP at limit=100 with the response cache disabled.
+
+    cd backend && python -m benchmarks.bench_list_endpoints --scale 0.02 --iterations 200
+"""
+import argparse
+import asyncio
+import os
+import time
+from typing import List
+
+from benchmarks.common import default_database_url, load_app, client_for, summarize, emit
+
+LIMIT = 100
+
+async def cpu_per_call(func, iterations: int) -> float:
+    """Average CPU milliseconds per awaited call (after a short warmup)."""
+    for _ in range(5):
+        await func()
+    started = time.process_time()
+    for _ in range(iterations):
+        await func()
+    return (time.process_time() - started) / iterations * 1000
+
+async def compare_strategies(iterations: int, buyer_id: int) -> dict:
+    from pydantic import TypeAdapter
+    from sqlalchemy import select
+    from database import AsyncSessionLocal
+    from models import User, Review, Listing, Message, PurchaseHistory
+    from schemas import UserResponse, ReviewResponse, ListingResponse, MessageResponse, PurchaseHistoryResponse
+    from main import response_columns
+
+    cases = {
+        "users": (User, UserResponse, None),
+        "reviews": (Review, ReviewResponse, None),
+        "listings": (Listing, ListingResponse, Listing.status == "ACTIVE"),
+        "messages": (Message, MessageResponse, None),
+        "purchase_history": (PurchaseHistory, PurchaseHistoryResponse, PurchaseHistory.buyer_id == buyer_id),
+    }
+    results = {}
+    for name, (model, schema, condition) in cases.items():
+        adapter = TypeAdapter(List[schema])
+        entity_query = select(model).limit(LIMIT)
+        projected_query = select(*response_columns(model, schema)).limit(LIMIT)
+        if condition is not None:
+            entity_query, projected_query = entity_query.where(condition), projected_query.where(condition)
+
+        async def entities():
+            async with AsyncSessionLocal() as db:
+                rows = (await db.execute(entity_query)).scalars().all()
+                adapter.dump_json(adapter.validate_python(rows, from_attributes=True))
+
+        async def projected():
+            async with AsyncSessionLocal() as db:
+                rows = [row._asdict() for row in await db.execute(projected_query)]
+                adapter.dump_json(adapter.validate_python(rows))
+
+        entity_ms = await cpu_per_call(entities, iterations)
+        projected_ms = await cpu_per_call(projected, iterations)
+        results[name] = {
+            "entity_cpu_ms": round(entity_ms, 3),
+            "projected_cpu_ms": round(projected_ms, 3),
+            "cpu_saved_pct": round((1 - projected_ms / entity_ms) * 100, 1) if entity_ms else 0.0,
+        }
+    return results
+
+async def time_endpoints(app, iterations: int, buyer_email: str, password: str) -> dict:
+    async with client_for(app) as client:
+        token = (await client.post("/login", json={"email": buyer_email, "password": password})).json()["access_token"]
+        room_id = (await client.get("/messages", params={"limit": 1})).json()[0]["room_id"]
+        requests = {
+            "GET /users": lambda: client.get("/users", params={"limit": LIMIT}),
+            "GET /reviews": lambda: client.get("/reviews", params={"limit": LIMIT}),
+            "GET /listings": lambda: client.get("/listings", params={"limit": LIMIT}),
+            "GET /messages": lambda: client.get("/messages", params={"room_id": room_id, "limit": LIMIT}),
+            "GET /purchase-history/me": lambda: client.get(
+                "/purchase-history/me", params={"limit": LIMIT}, headers={"Authorization": f"Bearer {token}"}
+            ),
+        }
+        results = {}
+        for name, request in requests.items():
+            for _ in range(5):
+                (await request()).raise_for_status()
+            latencies = []
+            cpu_started, started = time.process_time(), time.perf_counter()
+            for _ in range(iterations):
+                request_started = time.perf_counter()
+                response = await request()
+                latencies.append(time.perf_counter() - request_started)
+            cpu = time.process_time() - cpu_started
+            results[name] = summarize(
+                latencies, time.perf_counter() - started,
+                rows=len(response.json()), cpu_ms_per_request=round(cpu / iterations * 1000, 3),
+            )
+    return results
+
+async def run(args):
+    # Measure the handlers, not response cache hits
+    os.environ["RESPONSE_CACHE_TTL"] = "0"
+    app = load_app(args.database_url)
+    from sqlalchemy import func, select
+    from database import AsyncSessionLocal
+    from models import User, PurchaseHistory
+    from seed import seed
+
+    async with AsyncSessionLocal() as db:
+        if await db.scalar(select(User.id).limit(1)) is None:
+            await seed(scale=args.scale, password=args.password)
+        buyer_id = await db.scalar(
+            select(PurchaseHistory.buyer_id).group_by(PurchaseHistory.buyer_id)
+            .order_by(func.count().desc()).limit(1)
+        )
+        buyer_email = await db.scalar(select(User.email).where(User.id == buyer_id))
+
+    emit({
+        "benchmark": "list_endpoints",
+        "limit": LIMIT,
+        "iterations": args.iterations,
+        "strategies": await compare_strategies(args.iterations, buyer_id),
+        "endpoints": await time_endpoints(app, args.iterations, buyer_email, args.password),
+    }, args.output)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default=default_database_url())
+    parser.add_argument("--scale", type=float, default=0.02, help="seed.py scale factor for an empty database")
+    parser.add_argument("--password", default="password", help="password of the seeded users")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--output")
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
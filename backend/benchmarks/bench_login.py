@@ -0,0 +1,84 @@
+"""Login storm benchmark.
+
+Measures login throughput and the latency of an unrelated endpoint
+(GET /servers) while a burst of logins is in flight, to show whether
+password hashing is starving the event loop.
+
+    cd backend && python -m benchmarks.bench_login --logins 200 --concurrency 50
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import default_database_url, load_app, client_for, summarize, timed, emit
+
+async def probe(client, stop: asyncio.Event, latencies: list):
+    while not stop.is_set():
+        _, elapsed = await timed(client.get("/servers"))
+        latencies.append(elapsed)
+        await asyncio.sleep(0.01)
+
+async def login_storm(client, users: int, logins: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, statuses = [], {}
+
+    async def one(i):
+        async with semaphore:
+            payload = {"email": f"bench{i % users}@example.com", "password": "benchpass"}
+            response, elapsed = await timed(client.post("/login", json=payload))
+            latencies.append(elapsed)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(logins)))
+    return latencies, statuses, time.perf_counter() - start
+
+async def run(args):
+    app = load_app(args.database_url)
+    from auth import get_password_hash
+    from database import SessionLocal
+    from models import User, Server
+
+    db = SessionLocal()
+    if not db.query(User).filter(User.email == "bench0@example.com").first():
+        password_hash = get_password_hash("benchpass")
+        db.add_all([User(email=f"bench{i}@example.com", username=f"bench{i}", password_hash=password_hash) for i in range(args.users)])
+        db.add_all([Server(name=f"Bench {i}", chronicle="Interlude") for i in range(10)])
+        db.commit()
+    db.close()
+
+    async with client_for(app) as client:
+        # Baseline: the probe endpoint with no login traffic
+        stop, baseline = asyncio.Event(), []
+        task = asyncio.create_task(probe(client, stop, baseline))
+        await asyncio.sleep(args.baseline_seconds)
+        stop.set()
+        await task
+
+        stop, during = asyncio.Event(), []
+        task = asyncio.create_task(probe(client, stop, during))
+        login_latencies, statuses, elapsed = await login_storm(client, args.users, args.logins, args.concurrency)
+        stop.set()
+        await task
+
+    import auth
+    emit({
+        "benchmark": "login_storm",
+        "login": summarize(login_latencies, elapsed, statuses=statuses),
+        "probe_baseline": summarize(baseline, args.baseline_seconds),
+        "probe_during_storm": summarize(during, elapsed),
+        "password_hasher": auth.password_hasher.stats(),
+    }, args.output)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default=default_database_url())
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--baseline-seconds", type=float, default=2.0)
+    parser.add_argument("--output")
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
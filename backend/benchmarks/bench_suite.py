@@ -0,0 +1,255 @@
+"""Hot-path benchmark suite.
+
+Seeds a realistic dataset with seed.py (hot servers, power sellers, busy
+chat rooms), serves the API with uvicorn in-process and measures throughput and
+p50/p95/p99 for login, filtered /listings, /servers/activity, /chat/rooms,
+reputation lookups and WebSocket fan-out. Results are JSON, so runs on
+different commits can be compared with --baseline:
+
+    cd backend && python -m benchmarks.bench_suite --output before.json
+    cd backend && python -m benchmarks.bench_suite --baseline before.json --output after.json
+
+Use --database-url for a local Postgres. --base-url drives an already
+running server instead (its database must hold the same seeded data).
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.common import default_database_url, load_app, summarize, timed, emit
+
+SCENARIOS = ["login", "listings", "servers_activity", "chat_rooms", "reputation", "reputation_batch", "ws_fanout"]
+PASSWORD = "password"
+
+SEARCH_TERMS = ["fast delivery", "bulk", "instant", "cheap adena", "clan stock", "discount"]
+
+# Listing filter combinations the marketplace UI sends, in rough proportion
+LISTING_FILTERS = [
+    lambda rng, d: {},
+    lambda rng, d: {"server_id": d.hot_server(rng)},
+    lambda rng, d: {"server_id": d.hot_server(rng), "type": rng.choice(["SELL", "BUY"])},
+    lambda rng, d: {"server_id": d.hot_server(rng), "type": "SELL", "price_min": 1, "price_max": rng.choice([2, 3, 5])},
+    lambda rng, d: {"description_search": rng.choice(SEARCH_TERMS)},
+    lambda rng, d: {"seller_id": d.power_seller(rng)},
+]
+
+class Dataset:
+    """Ids of the seeded data and its skew (see seed.py), for the request generators."""
+
+    def __init__(self, user_ids: list, server_ids: list, power_sellers: int):
+        self.user_ids = user_ids
+        self.server_ids = server_ids
+        self.power_sellers = power_sellers
+
+    def hot_server(self, rng: random.Random) -> int:
+        # Quadratic skew: the first servers carry most listings
+        return self.server_ids[int(rng.random() ** 2 * len(self.server_ids))]
+
+    def power_seller(self, rng: random.Random) -> int:
+        return self.user_ids[rng.randrange(self.power_sellers)]
+
+    def busy_user(self, rng: random.Random) -> int:
+        return self.power_seller(rng)
+
+async def prepare(scale: float, seed_value: int) -> tuple:
+    """Seed the database unless it already holds data; returns the Dataset and table row counts."""
+    from sqlalchemy import func, select
+    from database import AsyncSessionLocal
+    from models import User, Server, Listing, Review, PurchaseHistory, SellerLike, Message
+    from seed import POWER_SELLER_SHARE, seed
+
+    async with AsyncSessionLocal() as db:
+        seeded = await db.scalar(select(User.id).limit(1)) is not None
+    if not seeded:
+        await seed(scale=scale, seed=seed_value, password=PASSWORD,
+                   log=lambda line: print(f"seed {line}", file=sys.stderr))
+    async with AsyncSessionLocal() as db:
+        user_ids = list((await db.scalars(select(User.id).where(User.email.like("user%@example.com")).order_by(User.id))).all())
+        server_ids = list((await db.scalars(select(Server.id).order_by(Server.id))).all())
+        dataset = Dataset(user_ids, server_ids, max(1, int(len(user_ids) * POWER_SELLER_SHARE)))
+        counts = {}
+        for model in (User, Server, Listing, Review, PurchaseHistory, SellerLike, Message):
+            counts[model.__tablename__] = await db.scalar(select(func.count()).select_from(model))
+    return dataset, counts
+
+async def start_server(app):
+    import uvicorn
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        if task.done():
+            task.result()
+        await asyncio.sleep(0.05)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    return server, task, f"http://127.0.0.1:{port}"
+
+async def load(make_request, requests: int, concurrency: int, warmup: int) -> dict:
+    """Fire `requests` calls of make_request(i) with bounded concurrency; summarize latencies."""
+    for i in range(warmup):
+        await make_request(-1 - i)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, statuses = [], {}
+
+    async def one(i):
+        async with semaphore:
+            response, elapsed = await timed(make_request(i))
+            latencies.append(elapsed)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return summarize(latencies, time.perf_counter() - start, statuses=statuses)
+
+async def login_token(client, user_id: int) -> str:
+    response = await client.post("/login", json={"email": f"user{user_id}@example.com", "password": PASSWORD})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+async def _drain(socket):
+    async for _ in socket:
+        pass
+
+async def ws_fanout(client, base_url: str, dataset: Dataset, args) -> dict:
+    """One sender, many receivers in one room; latency from send to delivery at each receiver."""
+    from websockets.asyncio.client import connect
+
+    seller_id, buyer_id = dataset.user_ids[0], dataset.user_ids[-1]
+    buyer_token = await login_token(client, buyer_id)
+    seller_token = await login_token(client, seller_id)
+    # Rooms must name a real listing of the seller; power sellers always have one
+    response = await client.get("/listings", params={"seller_id": seller_id, "limit": 1})
+    response.raise_for_status()
+    room_id = f"{response.json()[0]['id']}_{buyer_id}_{seller_id}"
+    ws_url = base_url.replace("http", "ws", 1) + f"/ws/chat/{room_id}?token="
+
+    latencies, expected = [], args.ws_receivers * args.ws_messages
+    done = asyncio.Event()
+
+    async def receive(socket):
+        async for raw in socket:
+            latencies.append(time.perf_counter() - json.loads(json.loads(raw)["content"])["sent_at"])
+            if len(latencies) >= expected:
+                done.set()
+
+    receivers = [await connect(ws_url + (buyer_token if i % 2 else seller_token)) for i in range(args.ws_receivers)]
+    readers = [asyncio.create_task(receive(socket)) for socket in receivers]
+    async with connect(ws_url + buyer_token) as sender:
+        # The sender gets its own broadcasts too; drain them so it is not evicted as a slow consumer
+        readers.append(asyncio.create_task(_drain(sender)))
+        start = time.perf_counter()
+        for i in range(args.ws_messages):
+            await sender.send(json.dumps({"content": json.dumps({"i": i, "sent_at": time.perf_counter()})}))
+            await asyncio.sleep(args.ws_interval)
+        try:
+            await asyncio.wait_for(done.wait(), timeout=30)
+        except asyncio.TimeoutError:
+            pass
+        elapsed = time.perf_counter() - start
+    for task in readers:
+        task.cancel()
+    for socket in receivers:
+        await socket.close()
+    return summarize(latencies, elapsed, delivered=len(latencies), expected=expected, receivers=args.ws_receivers)
+
+async def run(args):
+    if args.no_response_cache:
+        os.environ["RESPONSE_CACHE_TTL"] = "0"
+    app = load_app(args.database_url)
+    # Per-request client logging would dominate the measurements
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    from database import async_engine
+
+    dataset, counts = await prepare(args.scale, args.seed)
+    server = task = None
+    base_url = args.base_url
+    if base_url is None:
+        server, task, base_url = await start_server(app)
+
+    rng = random.Random(args.seed)
+    results = {}
+    try:
+        async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=httpx.Limits(max_connections=args.concurrency)) as client:
+            busy_users = sorted({dataset.busy_user(rng) for _ in range(10)})
+            tokens = [await login_token(client, user_id) for user_id in busy_users]
+            scenarios = {
+                "login": lambda i: client.post("/login", json={"email": f"user{rng.choice(dataset.user_ids)}@example.com", "password": PASSWORD}),
+                "listings": lambda i: client.get("/listings", params={**rng.choice(LISTING_FILTERS)(rng, dataset), "limit": 20}),
+                "servers_activity": lambda i: client.get("/servers/activity"),
+                "chat_rooms": lambda i: client.get("/chat/rooms", headers={"Authorization": f"Bearer {rng.choice(tokens)}"}),
+                "reputation": lambda i: client.get(f"/users/{dataset.power_seller(rng) if rng.random() < 0.5 else rng.choice(dataset.user_ids)}/reputation"),
+                "reputation_batch": lambda i: client.get("/users/reputation", params={"user_ids": rng.sample(dataset.user_ids, 20)}),
+            }
+            for name in args.scenarios:
+                if name == "ws_fanout":
+                    results[name] = await ws_fanout(client, base_url, dataset, args)
+                else:
+                    # Logins are CPU-bound by design; keep them to a smaller batch
+                    requests = min(args.requests, args.login_requests) if name == "login" else args.requests
+                    results[name] = await load(scenarios[name], requests, args.concurrency, args.warmup)
+                print(f"{name}: p50 {results[name]['p50_ms']} ms, p95 {results[name]['p95_ms']} ms, "
+                      f"{results[name]['throughput_rps']} req/s", file=sys.stderr)
+    finally:
+        if server is not None:
+            server.should_exit = True
+            await task
+
+    report = {
+        "benchmark": "suite",
+        "commit": _git_commit(),
+        "database": async_engine.dialect.name,
+        "dataset": counts,
+        "config": {"scale": args.scale, "seed": args.seed, "requests": args.requests, "concurrency": args.concurrency, "response_cache": not args.no_response_cache},
+        "scenarios": results,
+    }
+    if args.baseline:
+        compare(json.load(open(args.baseline)), report)
+    emit(report, args.output)
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+def compare(baseline: dict, current: dict):
+    """Print per-scenario changes against an earlier run (stderr, so stdout stays JSON)."""
+    print(f"vs {baseline.get('commit')}:", file=sys.stderr)
+    for name, now in current["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        changes = []
+        for key in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps"):
+            if before.get(key):
+                changes.append(f"{key} {before[key]} -> {now[key]} ({(now[key] - before[key]) / before[key] * 100:+.1f}%)")
+        print(f"  {name}: " + ", ".join(changes), file=sys.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default=default_database_url())
+    parser.add_argument("--base-url", help="benchmark a running server instead of an in-process one")
+    parser.add_argument("--scenarios", nargs="+", default=SCENARIOS, choices=SCENARIOS)
+    parser.add_argument("--scale", type=float, default=0.02, help="seed.py scale factor (1.0 is about a million listings)")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--login-requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--ws-receivers", type=int, default=50)
+    parser.add_argument("--ws-messages", type=int, default=50)
+    parser.add_argument("--ws-interval", type=float, default=0.01)
+    parser.add_argument("--no-response-cache", action="store_true", help="measure the handlers, not cache hits")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--baseline", help="earlier --output file to compare against")
+    parser.add_argument("--output")
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
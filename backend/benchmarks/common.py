@@ -0,0 +1,63 @@
+import json
+import os
+import sys
+import tempfile
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+def default_database_url() -> str:
+    # Throwaway SQLite file so benchmarks never touch a real database by accident
+    path = os.path.join(tempfile.mkdtemp(prefix="l2adena-bench-"), "bench.db")
+    return f"sqlite:///{path}"
+
+def load_app(database_url: str):
+    """Import the API against `database_url` and make sure the schema exists."""
+    # database.py reads DATABASE_URL at import time, so set it first
+    os.environ["DATABASE_URL"] = database_url
+    os.environ.pop("ASYNC_DATABASE_URL", None)
+    from database import Base, engine
+    import models  # noqa: F401  (registers tables on Base.metadata)
+    Base.metadata.create_all(bind=engine)
+    import main
+    return main.app
+
+def client_for(app) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60)
+
+def percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+def summarize(latencies, elapsed: float, **extra) -> dict:
+    """Throughput and latency percentiles (milliseconds) for one measured run."""
+    result = {
+        "requests": len(latencies),
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(max(latencies) * 1000, 2) if latencies else 0.0,
+    }
+    result.update(extra)
+    return result
+
+async def timed(coro):
+    start = time.perf_counter()
+    response = await coro
+    return response, time.perf_counter() - start
+
+def emit(results: dict, output: str = None):
+    text = json.dumps(results, indent=2)
+    if output:
+        with open(output, "w") as f:
+            f.write(text + "\n")
+    print(text)
@@ -0,0 +1,133 @@
+"""EXPLAIN regression check for GET /listings filter combinations and featured expiry.
+
+Seeds the listings table up to --rows rows (1M by default), then asserts
+that the planner never answers a common filter combination with a
+sequential scan of `listings`. Exits non-zero on a regression, so it can
+gate CI against a scratch Postgres database:
+
+    cd backend && python -m benchmarks.explain_listings --database-url postgresql://...
+"""
+import argparse
+import json
+import sys
+
+from benchmarks.common import default_database_url, load_app
+
+# Filter combinations the marketplace UI actually sends
+CASES = {
+    "feed": {},
+    "server": {"server_id": 1},
+    "server_type": {"server_id": 1, "type": "SELL"},
+    "server_type_price": {"server_id": 1, "type": "SELL", "price_min": 1.0, "price_max": 2.0},
+    "server_type_quantity": {"server_id": 1, "type": "BUY", "quantity_min": 1000},
+    "seller": {"seller_id": 42},
+}
+
+# Text search only has index support on Postgres (migration 007)
+POSTGRES_CASES = {
+    "description_search": {"description_search": "listing 4242"},
+    "description_relevance": {"description_search": "listing 4242", "sort": "relevance"},
+    "chronicle": {"chronicle": "interl"},
+}
+
+SEED_SQL = {
+    "postgresql": [
+        "INSERT INTO users (email, username, password_hash, is_verified, is_admin, language, created_at) "
+        "SELECT 'seed' || g || '@example.com', 'seed' || g, 'x', g % 3 = 0, false, 'en', now() "
+        "FROM generate_series(1, :users) g ON CONFLICT DO NOTHING",
+        "INSERT INTO servers (name, chronicle) "
+        "SELECT 'Seed ' || g, 'Interlude' FROM generate_series(1, :servers) g ON CONFLICT DO NOTHING",
+        # Skewed towards low server ids to mimic a few hot servers
+        "INSERT INTO listings (seller_id, server_id, chronicle, type, quantity, price, description, status, is_featured, created_at) "
+        "SELECT 1 + (random() * (:users - 1))::int, 1 + floor(power(random(), 2) * :servers)::int, 'Interlude', "
+        "CASE WHEN random() < 0.7 THEN 'SELL' ELSE 'BUY' END, 1 + (random() * 100000)::int, "
+        "round((0.1 + random() * 10)::numeric, 2), 'seed listing ' || g, "
+        "CASE WHEN random() < 0.8 THEN 'ACTIVE' ELSE 'CLOSED' END, random() < 0.02, "
+        "now() - random() * interval '180 days' FROM generate_series(1, :rows) g",
+        "ANALYZE listings",
+    ],
+    "sqlite": [
+        "WITH RECURSIVE g(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM g WHERE n < :users) "
+        "INSERT OR IGNORE INTO users (email, username, password_hash, is_verified, is_admin, language, created_at) "
+        "SELECT 'seed' || n || '@example.com', 'seed' || n, 'x', n % 3 = 0, 0, 'en', datetime('now') FROM g",
+        "WITH RECURSIVE g(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM g WHERE n < :servers) "
+        "INSERT OR IGNORE INTO servers (name, chronicle) SELECT 'Seed ' || n, 'Interlude' FROM g",
+        "WITH RECURSIVE g(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM g WHERE n < :rows) "
+        "INSERT INTO listings (seller_id, server_id, chronicle, type, quantity, price, description, status, is_featured, created_at) "
+        "SELECT 1 + abs(random()) % :users, 1 + abs(random()) % :servers, 'Interlude', "
+        "CASE WHEN abs(random()) % 10 < 7 THEN 'SELL' ELSE 'BUY' END, 1 + abs(random()) % 100000, "
+        "0.1 + (abs(random()) % 1000) / 100.0, 'seed listing ' || n, "
+        "CASE WHEN abs(random()) % 10 < 8 THEN 'ACTIVE' ELSE 'CLOSED' END, abs(random()) % 50 = 0, "
+        "datetime('now', '-' || (abs(random()) % 15552000) || ' seconds') FROM g",
+        "ANALYZE",
+    ],
+}
+
+def seed(engine, rows: int):
+    from sqlalchemy import text
+    with engine.begin() as conn:
+        existing = conn.execute(text("SELECT count(*) FROM listings")).scalar()
+        if existing >= rows:
+            return existing
+        params = {"rows": rows - existing, "users": 10000, "servers": 50}
+        for statement in SEED_SQL[engine.dialect.name]:
+            conn.execute(text(statement), params)
+        return conn.execute(text("SELECT count(*) FROM listings")).scalar()
+
+def _pg_seq_scans(node):
+    scans = []
+    if node.get("Node Type") == "Seq Scan" and node.get("Relation Name") == "listings":
+        scans.append(node)
+    for child in node.get("Plans", []):
+        scans.extend(_pg_seq_scans(child))
+    return scans
+
+def explain(engine, statement):
+    """Return (plan text, True if listings is read with a full table scan)."""
+    from sqlalchemy import text
+    sql = str(statement.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+    with engine.connect() as conn:
+        if engine.dialect.name == "postgresql":
+            plan = conn.execute(text("EXPLAIN (FORMAT JSON) " + sql)).scalar()
+            plan = plan if isinstance(plan, list) else json.loads(plan)
+            return json.dumps(plan, indent=1), bool(_pg_seq_scans(plan[0]["Plan"]))
+        rows = conn.execute(text("EXPLAIN QUERY PLAN " + sql)).all()
+        details = [row[-1] for row in rows]
+        full_scan = any(d.startswith("SCAN listings") and "INDEX" not in d for d in details)
+        return "\n".join(details), full_scan
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default=default_database_url())
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--no-seed", action="store_true")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    load_app(args.database_url)
+    from database import engine
+    from main import listings_query
+    from scheduler import featured_expiry_statement
+
+    if not args.no_seed:
+        print(f"listings rows: {seed(engine, args.rows)}")
+
+    cases = dict(CASES)
+    if engine.dialect.name == "postgresql":
+        cases.update(POSTGRES_CASES)
+    statements = {name: listings_query(dialect=engine.dialect.name, **filters).limit(10) for name, filters in cases.items()}
+    statements["featured_expiry"] = featured_expiry_statement()
+    failures = []
+    for name, statement in statements.items():
+        plan, full_scan = explain(engine, statement)
+        print(f"{'FAIL' if full_scan else 'ok  '} {name}")
+        if args.verbose or full_scan:
+            print(plan)
+        if full_scan:
+            failures.append(name)
+    if failures:
+        print(f"sequential scan on listings for: {', '.join(failures)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,732 @@
+from fastapi import WebSocket
+from sqlalchemy import case, func, select, insert, text
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Awaitable, Callable, Iterable, Optional, Tuple
+from database import dialect_insert, async_engine, AsyncSessionLocal, DATABASE_URL
+from models import ChatRoom, Listing, Message, User
+import asyncio
+import collections
+import datetime
+import json
+import logging
+import os
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Fan-out backend for chat: "memory" (single process), "redis" or "postgres" (LISTEN/NOTIFY)
+CHAT_BROKER = os.getenv("CHAT_BROKER", "memory")
+CHAT_BROKER_URL = os.getenv("CHAT_BROKER_URL")
+
+# Per-socket outbound buffering: a client that falls this far behind, or stalls a send, is evicted
+CHAT_SEND_QUEUE_SIZE = int(os.getenv("CHAT_SEND_QUEUE_SIZE", "100"))
+CHAT_SEND_TIMEOUT = float(os.getenv("CHAT_SEND_TIMEOUT", "5"))
+
+# Close codes used when the server drops a client
+CLOSE_SLOW_CONSUMER = 1013  # "try again later"
+CLOSE_SEND_FAILED = 1011
+CLOSE_WRITER_BACKLOG = 1013
+
+# Write-behind persistence for WebSocket messages
+CHAT_WRITE_BATCH_SIZE = int(os.getenv("CHAT_WRITE_BATCH_SIZE", "200"))
+CHAT_WRITE_FLUSH_INTERVAL = float(os.getenv("CHAT_WRITE_FLUSH_INTERVAL", "0.05"))
+# Message ids are reserved from the sequence in blocks, one round trip per block; ids left
+# unused after CHAT_ID_BLOCK_MAX_AGE seconds are dropped so ids stay close to arrival order
+CHAT_ID_BLOCK_SIZE = int(os.getenv("CHAT_ID_BLOCK_SIZE", "100"))
+CHAT_ID_BLOCK_MAX_AGE = float(os.getenv("CHAT_ID_BLOCK_MAX_AGE", "1"))
+# Failed batches are retried whole this many times, then message by message; messages the
+# database keeps rejecting are dead-lettered (logged, and appended to CHAT_DEAD_LETTER_FILE)
+CHAT_WRITE_MAX_RETRIES = int(os.getenv("CHAT_WRITE_MAX_RETRIES", "3"))
+CHAT_DEAD_LETTER_FILE = os.getenv("CHAT_DEAD_LETTER_FILE")
+# Unsaved messages held at most; beyond this new messages are refused until the database catches up
+CHAT_WRITE_BUFFER_LIMIT = int(os.getenv("CHAT_WRITE_BUFFER_LIMIT", "10000"))
+
+# Most messages replayed to a reconnecting client (?since=<message_id>)
+CHAT_REPLAY_LIMIT = int(os.getenv("CHAT_REPLAY_LIMIT", "500"))
+
+def parse_room_id(room_id: str) -> Optional[Tuple[int, int, int]]:
+    """Split a "<listing_id>_<buyer_id>_<seller_id>" room id, or None if it is not one."""
+    parts = room_id.split('_')
+    if len(parts) != 3:
+        return None
+    try:
+        listing_id, buyer_id, seller_id = (int(part) for part in parts)
+    except ValueError:
+        return None
+    return listing_id, buyer_id, seller_id
+
+async def chat_room_is_valid(db: AsyncSession, room_id: str) -> bool:
+    """Whether messages may be stored for a room.
+
+    A "<listing_id>_<buyer_id>_<seller_id>" room must already exist, or name an existing
+    listing of that seller and an existing buyer; other room ids have no chat_rooms row.
+    """
+    parsed = parse_room_id(room_id)
+    if parsed is None or await db.get(ChatRoom, room_id) is not None:
+        return True
+    listing_id, buyer_id, seller_id = parsed
+    listing_seller = await db.scalar(select(Listing.seller_id).where(Listing.id == listing_id))
+    if listing_seller is None or listing_seller != seller_id:
+        return False
+    return await db.scalar(select(User.id).where(User.id == buyer_id)) is not None
+
+def fold_chat_rooms(messages: Iterable[dict]) -> dict:
+    """Chat room rows (keyed by room_id) summarizing messages with id, room_id, sender_id and created_at."""
+    rooms = {}
+    for message in messages:
+        room = rooms.get(message["room_id"])
+        if room is None:
+            parsed = parse_room_id(message["room_id"])
+            if parsed is None:
+                continue
+            room = rooms[message["room_id"]] = {
+                "room_id": message["room_id"],
+                "listing_id": parsed[0],
+                "buyer_id": parsed[1],
+                "seller_id": parsed[2],
+                "last_message_id": message["id"],
+                "last_message_at": message["created_at"],
+                "buyer_unread": 0,
+                "seller_unread": 0,
+            }
+        if message["id"] > room["last_message_id"]:
+            room["last_message_id"] = message["id"]
+            room["last_message_at"] = message["created_at"]
+        if message["sender_id"] != room["buyer_id"]:
+            room["buyer_unread"] += 1
+        if message["sender_id"] != room["seller_id"]:
+            room["seller_unread"] += 1
+    return rooms
+
+async def record_chat_messages(db: AsyncSession, messages: Iterable[dict]):
+    """Upsert the chat rooms for already-inserted messages inside the caller's transaction.
+
+    Messages are folded per room (see fold_chat_rooms) so a batch costs one upsert row per room.
+    """
+    rooms = fold_chat_rooms(messages)
+    if not rooms:
+        return
+    # A listing deleted since the room was checked leaves the room without one, as its FK would
+    listing_ids = {room["listing_id"] for room in rooms.values()}
+    existing = set((await db.scalars(select(Listing.id).where(Listing.id.in_(listing_ids)))).all())
+    for room in rooms.values():
+        if room["listing_id"] not in existing:
+            room["listing_id"] = None
+    statement = dialect_insert(db)(ChatRoom).values(list(rooms.values()))
+    newer = statement.excluded.last_message_id > ChatRoom.last_message_id
+    statement = statement.on_conflict_do_update(
+        index_elements=[ChatRoom.room_id],
+        set_={
+            # Never move the pointer backwards if an older insert commits last
+            "last_message_id": case((newer, statement.excluded.last_message_id), else_=ChatRoom.last_message_id),
+            "last_message_at": case((newer, statement.excluded.last_message_at), else_=ChatRoom.last_message_at),
+            "buyer_unread": ChatRoom.buyer_unread + statement.excluded.buyer_unread,
+            "seller_unread": ChatRoom.seller_unread + statement.excluded.seller_unread,
+        },
+    )
+    await db.execute(statement)
+
+async def record_chat_message(db: AsyncSession, message: Message):
+    """Upsert the message's chat room inside the caller's transaction (message must be flushed)."""
+    await record_chat_messages(db, [{
+        "id": message.id,
+        "room_id": message.room_id,
+        "sender_id": message.sender_id,
+        "created_at": message.created_at,
+    }])
+
+async def forget_chat_message(db: AsyncSession, message: Message):
+    """Update a message's chat room after the message is deleted (inside the caller's transaction).
+
+    Re-points the room at its newest remaining message, and takes the message off the unread
+    count of participants who had not read it. Rooms keep counts rather than read pointers: a
+    participant's unread messages are the newest `unread` ones the other side sent, so the
+    message was unread if fewer than that many of them remain after it.
+    """
+    room = await db.get(ChatRoom, message.room_id)
+    if room is None:
+        return
+    await db.flush()
+    result = await db.execute(
+        select(Message.id, Message.created_at)
+        .where(Message.room_id == message.room_id)
+        .order_by(Message.id.desc())
+        .limit(1)
+    )
+    latest = result.first()
+    room.last_message_id = latest.id if latest else None
+    room.last_message_at = latest.created_at if latest else None
+    for reader, unread in ((room.buyer_id, "buyer_unread"), (room.seller_id, "seller_unread")):
+        if message.sender_id == reader or not getattr(room, unread):
+            continue
+        newer = await db.scalar(
+            select(func.count())
+            .select_from(Message)
+            .where(Message.room_id == message.room_id, Message.id > message.id, Message.sender_id != reader)
+        )
+        if newer < getattr(room, unread):
+            setattr(room, unread, getattr(room, unread) - 1)
+
+class WriterBacklogFull(Exception):
+    """The write-behind buffer is full; the message was not accepted."""
+
+class MessageWriter:
+    """Write-behind persistence for WebSocket chat messages.
+
+    On Postgres, ids come from blocks of the messages sequence reserved by this worker and
+    handed out in memory, so a message is broadcast without waiting on the database; buffered
+    messages are written with one multi-row INSERT
+    every CHAT_WRITE_FLUSH_INTERVAL seconds or CHAT_WRITE_BATCH_SIZE messages, and drained on
+    shutdown. A batch that keeps failing is retried message by message so one bad row cannot
+    hold back the rest; rows the database rejects are dead-lettered. Dialects without
+    sequences (SQLite) write through, one transaction per message.
+
+    Ids are therefore not committed in id order across workers: a message can become visible
+    up to settle_seconds after a higher id did. Cursor reads hold back that window (settled)
+    and reconnect replays wait out commit_window and overlap the cursor (see replay_messages).
+    """
+
+    def __init__(self, batch_size: int = CHAT_WRITE_BATCH_SIZE, flush_interval: float = CHAT_WRITE_FLUSH_INTERVAL,
+                 id_block_size: int = CHAT_ID_BLOCK_SIZE, id_block_max_age: float = CHAT_ID_BLOCK_MAX_AGE,
+                 max_retries: int = CHAT_WRITE_MAX_RETRIES,
+                 buffer_limit: int = CHAT_WRITE_BUFFER_LIMIT, dead_letter_file: Optional[str] = CHAT_DEAD_LETTER_FILE):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.id_block_size = id_block_size
+        self.id_block_max_age = id_block_max_age
+        self.max_retries = max_retries
+        self.buffer_limit = buffer_limit
+        self.dead_letter_file = dead_letter_file
+        self.write_behind = False
+        self.flushed = 0
+        self.batches = 0
+        self.failures = 0
+        self.dead_letters = 0
+        self.rejected = 0
+        self._failed_attempts = 0
+        self._accepting = 0
+        self._buffer = []
+        self._ids = collections.deque()
+        self._ids_reserved_at = 0.0
+        self._id_lock = asyncio.Lock()
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    @property
+    def commit_window(self) -> float:
+        """How long an accepted message can stay unstored while flushes keep up."""
+        return self.flush_interval * (self.max_retries + 1) if self.write_behind else 0.0
+
+    @property
+    def settle_seconds(self) -> float:
+        # A lower id from another worker's older block is handed out at most id_block_max_age
+        # after a higher one, then takes up to commit_window to be stored
+        return self.id_block_max_age + self.commit_window if self.write_behind else 0.0
+
+    def settled(self, messages: list) -> list:
+        """Cut an id-ordered page before its first message that lower ids could still land behind."""
+        if not self.settle_seconds:
+            return messages
+        cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=self.settle_seconds)
+        for index, message in enumerate(messages):
+            if message["created_at"] > cutoff:
+                return messages[:index]
+        return messages
+
+    def pending_since(self, room_id: str, since: int, since_at: Optional[datetime.datetime] = None) -> list:
+        """Buffered (not yet stored) messages for a room, newer than `since` (by id, or created after since_at)."""
+        return [
+            m for m in self._buffer
+            if m["room_id"] == room_id and (m["id"] > since or (since_at is not None and m["created_at"] > since_at))
+        ]
+
+    async def start(self):
+        self.write_behind = async_engine.dialect.name == "postgresql"
+        if self.write_behind:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        # Drain whatever is still buffered before the process exits; the last attempt goes row by row
+        self._failed_attempts = max(self._failed_attempts, self.max_retries - 1)
+        for _ in range(2):
+            if not self._buffer:
+                break
+            await self.flush()
+        if self._buffer:
+            batch, self._buffer = self._buffer, []
+            self._dead_letter(batch, "unsaved at shutdown")
+
+    async def submit(self, room_id: str, sender_id: int, content: str) -> dict:
+        """Accept a message and return it with its final id and timestamp."""
+        if not self.write_behind:
+            return await self._write_through(room_id, sender_id, content)
+        # Count the slot before awaiting an id so concurrent submits cannot overshoot the limit
+        if len(self._buffer) + self._accepting >= self.buffer_limit:
+            self.rejected += 1
+            raise WriterBacklogFull(f"{len(self._buffer)} chat messages waiting to be stored")
+        self._accepting += 1
+        try:
+            message_id = await self._next_id()
+        finally:
+            self._accepting -= 1
+        message = {
+            "id": message_id,
+            "room_id": room_id,
+            "sender_id": sender_id,
+            "content": content,
+            "created_at": datetime.datetime.utcnow(),
+        }
+        self._buffer.append(message)
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+        return message
+
+    async def _write_through(self, room_id: str, sender_id: int, content: str) -> dict:
+        async with AsyncSessionLocal() as db:
+            db_message = Message(room_id=room_id, sender_id=sender_id, content=content)
+            db.add(db_message)
+            await db.flush()
+            await record_chat_message(db, db_message)
+            await db.commit()
+            self.flushed += 1
+            return {
+                "id": db_message.id,
+                "room_id": room_id,
+                "sender_id": sender_id,
+                "content": content,
+                "created_at": db_message.created_at,
+            }
+
+    async def _next_id(self) -> int:
+        if not self._ids or time.monotonic() - self._ids_reserved_at > self.id_block_max_age:
+            async with self._id_lock:
+                if not self._ids or time.monotonic() - self._ids_reserved_at > self.id_block_max_age:
+                    await self._reserve_ids()
+        return self._ids.popleft()
+
+    async def _reserve_ids(self):
+        try:
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(
+                    text("SELECT nextval(pg_get_serial_sequence('messages', 'id')) FROM generate_series(1, :n)"),
+                    {"n": self.id_block_size},
+                )
+                ids = sorted(row[0] for row in result.all())
+        except Exception as exc:
+            # Without ids nothing can be accepted; callers treat it like a full buffer
+            logger.exception("Failed to reserve chat message ids")
+            raise WriterBacklogFull("chat message ids unavailable") from exc
+        self._ids = collections.deque(ids)
+        self._ids_reserved_at = time.monotonic()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self._buffer:
+                return
+            batch, self._buffer = self._buffer, []
+            try:
+                await self._store(batch)
+            except Exception:
+                self.failures += 1
+                self._failed_attempts += 1
+                if self._failed_attempts < self.max_retries:
+                    # Keep the batch for the next attempt; order is restored by id on read
+                    self._buffer = batch + self._buffer
+                    logger.exception("Failed to persist %d chat messages; will retry", len(batch))
+                    return
+                logger.exception("Failed to persist %d chat messages %d times; retrying one by one", len(batch), self._failed_attempts)
+                self._failed_attempts = 0
+                self._buffer = await self._store_each(batch) + self._buffer
+                return
+            self._failed_attempts = 0
+            self.flushed += len(batch)
+            self.batches += 1
+
+    async def _store(self, messages: list):
+        async with AsyncSessionLocal() as db:
+            await db.execute(insert(Message), messages)
+            await record_chat_messages(db, messages)
+            await db.commit()
+
+    async def _store_each(self, batch: list) -> list:
+        """Store messages one at a time; returns those to retry later."""
+        for index, message in enumerate(batch):
+            try:
+                await self._store([message])
+            except (IntegrityError, DataError):
+                # The row itself is bad; retrying it would never succeed
+                self.failures += 1
+                self._dead_letter([message], "rejected by the database")
+                continue
+            except Exception:
+                # The database is unavailable; keep this message and the rest for the next flush
+                self.failures += 1
+                logger.exception("Failed to persist chat message %s; will retry", message["id"])
+                return batch[index:]
+            self.flushed += 1
+        return []
+
+    def _dead_letter(self, messages: list, reason: str):
+        self.dead_letters += len(messages)
+        lines = [json.dumps(message, default=str) for message in messages]
+        for line in lines:
+            logger.error("Dead-lettered chat message (%s): %s", reason, line)
+        if self.dead_letter_file:
+            try:
+                with open(self.dead_letter_file, "a") as dead_letters:
+                    dead_letters.writelines(line + "\n" for line in lines)
+            except OSError:
+                logger.exception("Could not write to %s", self.dead_letter_file)
+
+    def stats(self) -> dict:
+        return {
+            "write_behind": self.write_behind,
+            "pending": self.pending,
+            "flushed": self.flushed,
+            "batches": self.batches,
+            "failures": self.failures,
+            "dead_letters": self.dead_letters,
+            "rejected": self.rejected,
+        }
+
+Deliver = Callable[[str, str], Awaitable[None]]
+# Handler for an internal channel (see listen/notify): receives messages from other processes only
+Handler = Callable[[str], Awaitable[None]]
+
+class InMemoryBroker:
+    """Delivers only to sockets in this process; fine for a single uvicorn worker."""
+
+    async def start(self, deliver: Deliver):
+        self._deliver = deliver
+
+    async def stop(self):
+        pass
+
+    async def subscribe(self, room_id: str):
+        pass
+
+    async def unsubscribe(self, room_id: str):
+        pass
+
+    async def publish(self, room_id: str, message: str):
+        await self._deliver(room_id, message)
+
+    async def listen(self, channel: str, handler: Handler):
+        pass
+
+    def fits(self, message: str) -> bool:
+        return True
+
+    async def notify(self, channel: str, message: str):
+        # No other processes to tell
+        pass
+
+class RedisBroker:
+    """Redis pub/sub with one channel per room; pass `client` to run against a stand-in."""
+
+    prefix = "chat:"
+    # Internal channels live outside the room namespace, so no room id can reach them
+    system_prefix = "chat-system:"
+
+    def __init__(self, url: Optional[str] = None, client=None):
+        self.url = url or "redis://localhost:6379/0"
+        self.origin = uuid.uuid4().hex
+        self._client = client
+        self._reader = None
+        self._handlers = {}
+
+    async def start(self, deliver: Deliver):
+        self._deliver = deliver
+        if self._client is None:
+            try:
+                import redis.asyncio as redis
+            except ImportError:
+                raise RuntimeError("CHAT_BROKER=redis requires the 'redis' package")
+            self._client = redis.from_url(self.url)
+        self._pubsub = self._client.pubsub()
+        self._reader = asyncio.create_task(self._read())
+
+    async def stop(self):
+        if self._reader:
+            self._reader.cancel()
+            await asyncio.gather(self._reader, return_exceptions=True)
+        await self._pubsub.aclose()
+
+    async def subscribe(self, room_id: str):
+        await self._pubsub.subscribe(self.prefix + room_id)
+
+    async def unsubscribe(self, room_id: str):
+        await self._pubsub.unsubscribe(self.prefix + room_id)
+
+    async def publish(self, room_id: str, message: str):
+        # Local sockets get the message immediately; other processes via Redis
+        await self._deliver(room_id, message)
+        await self._client.publish(self.prefix + room_id, json.dumps({"origin": self.origin, "message": message}))
+
+    async def listen(self, channel: str, handler: Handler):
+        self._handlers[channel] = handler
+        await self._pubsub.subscribe(self.system_prefix + channel)
+
+    def fits(self, message: str) -> bool:
+        return True
+
+    async def notify(self, channel: str, message: str):
+        await self._client.publish(self.system_prefix + channel, json.dumps({"origin": self.origin, "message": message}))
+
+    async def _read(self):
+        while True:
+            try:
+                if not self._pubsub.subscribed:
+                    await asyncio.sleep(0.1)
+                    continue
+                event = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if event is None or event["type"] != "message":
+                    continue
+                channel = event["channel"]
+                channel = channel.decode() if isinstance(channel, bytes) else channel
+                data = json.loads(event["data"])
+                if data["origin"] == self.origin:
+                    continue
+                if channel.startswith(self.system_prefix):
+                    handler = self._handlers.get(channel[len(self.system_prefix):])
+                    if handler is not None:
+                        await handler(data["message"])
+                else:
+                    await self._deliver(channel[len(self.prefix):], data["message"])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Redis chat broker read failed")
+                await asyncio.sleep(1)
+
+class PostgresBroker:
+    """Postgres LISTEN/NOTIFY on a single channel; rooms are filtered in-process."""
+
+    channel = "chat_messages"
+    max_payload = 7900  # NOTIFY payloads are capped at 8000 bytes
+
+    def __init__(self, dsn: Optional[str] = None):
+        # asyncpg wants a plain libpq URL, without the SQLAlchemy driver suffix
+        dsn = dsn or DATABASE_URL
+        self.dsn = "postgresql://" + dsn.split("://", 1)[1]
+        self.origin = uuid.uuid4().hex
+        self._rooms = set()
+        self._tasks = set()
+        self._handlers = {}
+
+    async def start(self, deliver: Deliver):
+        import asyncpg
+        self._deliver = deliver
+        self._listener = await asyncpg.connect(self.dsn)
+        await self._listener.add_listener(self.channel, self._on_notify)
+        self._pool = await asyncpg.create_pool(self.dsn, min_size=1, max_size=4)
+
+    async def stop(self):
+        await self._listener.remove_listener(self.channel, self._on_notify)
+        for channel in self._handlers:
+            await self._listener.remove_listener(self._system_channel(channel), self._on_system_notify)
+        await self._listener.close()
+        await self._pool.close()
+
+    async def subscribe(self, room_id: str):
+        self._rooms.add(room_id)
+
+    async def unsubscribe(self, room_id: str):
+        self._rooms.discard(room_id)
+
+    async def publish(self, room_id: str, message: str):
+        await self._deliver(room_id, message)
+        payload = json.dumps({"origin": self.origin, "room_id": room_id, "message": message})
+        if len(payload.encode()) > self.max_payload:
+            logger.warning("Chat message in room %s too large for NOTIFY; delivered locally only", room_id)
+            return
+        await self._pool.execute("SELECT pg_notify($1, $2)", self.channel, payload)
+
+    def _system_channel(self, channel: str) -> str:
+        # A NOTIFY channel of its own, on the same LISTEN connection as the chat rooms
+        return f"{self.channel}_{channel}"
+
+    async def listen(self, channel: str, handler: Handler):
+        self._handlers[channel] = handler
+        await self._listener.add_listener(self._system_channel(channel), self._on_system_notify)
+
+    def _system_payload(self, message: str) -> str:
+        return json.dumps({"origin": self.origin, "message": message})
+
+    def fits(self, message: str) -> bool:
+        return len(self._system_payload(message).encode()) <= self.max_payload
+
+    async def notify(self, channel: str, message: str):
+        if not self.fits(message):
+            logger.warning("Message for channel %s too large for NOTIFY; dropped", channel)
+            return
+        await self._pool.execute("SELECT pg_notify($1, $2)", self._system_channel(channel), self._system_payload(message))
+
+    def _on_notify(self, connection, pid, channel, payload):
+        data = json.loads(payload)
+        if data["origin"] == self.origin or data["room_id"] not in self._rooms:
+            return
+        self._spawn(self._deliver(data["room_id"], data["message"]))
+
+    def _on_system_notify(self, connection, pid, channel, payload):
+        data = json.loads(payload)
+        handler = self._handlers.get(channel[len(self.channel) + 1:])
+        if data["origin"] == self.origin or handler is None:
+            return
+        self._spawn(handler(data["message"]))
+
+    def _spawn(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+def create_broker(kind: str = CHAT_BROKER, url: Optional[str] = CHAT_BROKER_URL):
+    if kind == "redis":
+        return RedisBroker(url)
+    if kind == "postgres":
+        return PostgresBroker(url)
+    if kind == "memory":
+        return InMemoryBroker()
+    raise ValueError(f"Unknown CHAT_BROKER {kind!r}")
+
+class ClientConnection:
+    """A socket plus its bounded outbound queue, drained by a dedicated writer task."""
+
+    def __init__(self, websocket: WebSocket, room_id: str, manager: "ConnectionManager", paused: bool = False):
+        self.websocket = websocket
+        self.room_id = room_id
+        self.manager = manager
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=manager.send_queue_size)
+        # A paused connection buffers live messages until the caller has sent its replay
+        self.ready = asyncio.Event()
+        if not paused:
+            self.ready.set()
+        self.writer = asyncio.create_task(self._write())
+
+    def offer(self, message: str) -> bool:
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def _write(self):
+        await self.ready.wait()
+        while True:
+            message = await self.queue.get()
+            try:
+                await asyncio.wait_for(self.websocket.send_text(message), self.manager.send_timeout)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Timed out or the socket is already gone
+                self.manager.evict(self, CLOSE_SEND_FAILED)
+                return
+
+class ConnectionManager:
+    def __init__(self, broker=None, send_queue_size: int = CHAT_SEND_QUEUE_SIZE, send_timeout: float = CHAT_SEND_TIMEOUT):
+        self.active_connections: dict[str, dict[WebSocket, ClientConnection]] = {}
+        self.broker = broker or InMemoryBroker()
+        self.send_queue_size = send_queue_size
+        self.send_timeout = send_timeout
+        self.evicted_slow = 0
+        self.evicted_failed = 0
+        self._closing = set()
+
+    async def start(self):
+        await self.broker.start(self.deliver)
+
+    async def stop(self):
+        for room in list(self.active_connections.values()):
+            for connection in list(room.values()):
+                connection.writer.cancel()
+        self.active_connections.clear()
+        await self.broker.stop()
+
+    async def connect(self, websocket: WebSocket, room_id: str, paused: bool = False):
+        await websocket.accept()
+        if room_id not in self.active_connections:
+            self.active_connections[room_id] = {}
+            await self.broker.subscribe(room_id)
+        self.active_connections[room_id][websocket] = ClientConnection(websocket, room_id, self, paused=paused)
+
+    def resume(self, websocket: WebSocket, room_id: str):
+        connection = self.active_connections.get(room_id, {}).get(websocket)
+        if connection is not None:
+            connection.ready.set()
+
+    def _remove(self, websocket: WebSocket, room_id: str) -> Optional[ClientConnection]:
+        room = self.active_connections.get(room_id)
+        if room is None:
+            return None
+        connection = room.pop(websocket, None)
+        if connection is not None:
+            connection.writer.cancel()
+        if not room:
+            del self.active_connections[room_id]
+            self._spawn(self.broker.unsubscribe(room_id))
+        return connection
+
+    async def disconnect(self, websocket: WebSocket, room_id: str):
+        self._remove(websocket, room_id)
+
+    def evict(self, connection: ClientConnection, code: int):
+        if self._remove(connection.websocket, connection.room_id) is None:
+            return
+        if code == CLOSE_SLOW_CONSUMER:
+            self.evicted_slow += 1
+        else:
+            self.evicted_failed += 1
+        logger.warning("Evicting chat client from room %s (close code %s)", connection.room_id, code)
+        self._spawn(self._close(connection.websocket, code))
+
+    async def _close(self, websocket: WebSocket, code: int):
+        try:
+            await asyncio.wait_for(websocket.close(code=code), self.send_timeout)
+        except Exception:
+            pass
+
+    def _spawn(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    def stats(self) -> dict:
+        connections = [c for room in self.active_connections.values() for c in room.values()]
+        return {
+            "rooms": len(self.active_connections),
+            "connections": len(connections),
+            "queued_messages": sum(c.queue.qsize() for c in connections),
+            "evicted_slow": self.evicted_slow,
+            "evicted_failed": self.evicted_failed,
+        }
+
+    async def broadcast(self, message: str, room_id: str):
+        # Goes through the broker so sockets held by other workers/replicas receive it too
+        await self.broker.publish(room_id, message)
+
+    async def deliver(self, room_id: str, message: str):
+        # Never awaits a socket: each connection's writer task sends concurrently
+        for connection in list(self.active_connections.get(room_id, {}).values()):
+            if not connection.offer(message):
+                self.evict(connection, CLOSE_SLOW_CONSUMER)
@@ -2,33 +2,93 @@ from fastapi import FastAPI, Depends, HTTPException, status, Request, Response,
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select, insert, update, tuple_, or_, literal, delete, case
 from typing import List, Optional
-from database import get_db
-from models import User, Profile, Review, Listing, Message, PurchaseHistory, SellerLike, Server
+from database import get_async_db, async_engine, AsyncSessionLocal, connection_kind, pool_stats
+from models import User, Profile, Review, Listing, Message, PurchaseHistory, SellerLike, Server, ServerStats, SellerStats, ChatRoom, LISTING_SEARCH_DOCUMENT
 from schemas import (
-    UserCreate, UserLogin, UserResponse, Token, UserLanguageUpdate,
+    UserCreate, UserLogin, UserResponse, Token, UserLanguageUpdate, SellerReputationResponse,
     ProfileCreate, ProfileUpdate, ProfileResponse,
     ReviewCreate, ReviewResponse,
     ListingCreate, ListingUpdate, ListingResponse,
+    ListingBulkCreate, ListingBulkUpdate, ListingBulkResult,
     MessageCreate, MessageResponse,
     PurchaseHistoryResponse, SellerLikeCreate, SellerLikeResponse,
-    ServerCreate, ServerResponse, ServerActivityResponse
+    ServerCreate, ServerResponse, ServerActivityResponse, OrderBookResponse, PriceBucketResponse, ListingType
 )
-from auth import authenticate_user, create_access_token, get_current_user, get_password_hash, SECRET_KEY, ALGORITHM
+from auth import (
+    authenticate_user, create_access_token, get_current_user, password_hasher, principal_cache,
+    resolve_principal, invalidate_principal, token_claims, Principal, SECRET_KEY, ALGORITHM
+)
+from stats import ListingState, apply_listing_changes, apply_seller_verification, apply_purchase, reconcile_server_stats, adjust_seller_stats, SERVER_STATS_RECONCILE_SECONDS
+from scheduler import Scheduler, expire_featured, FEATURED_EXPIRY_SECONDS
+from response_cache import create_response_cache
+import metrics
+from query_inspector import query_inspector
+from orderbook import OrderBook, run_order_book_refresher
+from pricehistory import record_price_events, listing_event, price_history, RESOLUTIONS, SOURCES
+from chat import parse_room_id, chat_room_is_valid, record_chat_message, forget_chat_message, ConnectionManager, MessageWriter, WriterBacklogFull, create_broker, CHAT_REPLAY_LIMIT, CLOSE_WRITER_BACKLOG
 from jose import JWTError, jwt
 from datetime import timedelta, datetime
+from contextlib import asynccontextmanager
+import asyncio
 import os
 import json
+import base64
 import logging
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+manager = ConnectionManager(create_broker())
+message_writer = MessageWriter()
+response_cache = create_response_cache()
+order_book = OrderBook(manager.broker)
+
+async def expire_featured_job(db: AsyncSession) -> int:
+    expired = await expire_featured(db)
+    await db.commit()
+    if expired:
+        await response_cache.invalidate("listings")
+    return expired
+
+async def reconcile_server_stats_job(db: AsyncSession):
+    await reconcile_server_stats(db)
+    await db.commit()
+
+# Cluster-wide jobs, run only by the replica that wins leader election
+scheduler = Scheduler()
+scheduler.add_job("expire_featured", FEATURED_EXPIRY_SECONDS, expire_featured_job)
+scheduler.add_job("reconcile_server_stats", SERVER_STATS_RECONCILE_SECONDS, reconcile_server_stats_job)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await manager.start()
+    await message_writer.start()
+    # Subscribe before loading so changes made by other workers meanwhile are not missed
+    await order_book.start()
+    await order_book.rebuild()
+    # Background maintenance tasks live for the lifetime of the process
+    tasks = [
+        asyncio.create_task(scheduler.run()),
+        asyncio.create_task(run_order_book_refresher(order_book)),
+    ]
+    yield
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await message_writer.stop()
+    await order_book.stop()
+    await manager.stop()
+    await response_cache.close()
+
 # FastAPI app
-app = FastAPI(title="L2 Adena Marketplace API", version="1.0.0")
+app = FastAPI(title="L2 Adena Marketplace API", version="1.0.0", lifespan=lifespan)
+
+# Response cache for anonymous reads; registered first so it sits inside CORS and compression
+app.middleware("http")(response_cache.middleware)
 
 # CORS
 app.add_middleware(
@@ -37,6 +97,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 # Compression middleware
@@ -51,44 +112,52 @@ async def add_security_headers(request: Request, call_next):
     response.headers["X-XSS-Protection"] = "1; mode=block"
     return response
 
-security = HTTPBearer()
+# Opt-in N+1 / slow query / query budget checks (QUERY_INSPECTOR=1, development and staging)
+if query_inspector.enabled:
+    query_inspector.install(async_engine.sync_engine)
+    app.middleware("http")(query_inspector.middleware)
 
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: dict[str, list[WebSocket]] = {}
+# Request metrics; registered last so it is the outermost layer and times everything
+app.middleware("http")(metrics.middleware)
 
-    async def connect(self, websocket: WebSocket, room_id: str):
-        await websocket.accept()
-        if room_id not in self.active_connections:
-            self.active_connections[room_id] = []
-        self.active_connections[room_id].append(websocket)
+# Existing component stats, exported as gauges on /metrics
+metrics.register_stats("password_hashing", password_hasher.stats)
+metrics.register_stats("principal_cache", lambda: {"entries": len(principal_cache), "hits": principal_cache.hits, "misses": principal_cache.misses})
+metrics.register_stats("db_pool", pool_stats, labels={"checked_out_by_kind": "kind"})
+metrics.register_stats("chat_connections", manager.stats)
+metrics.register_stats("chat_writer", message_writer.stats)
+metrics.register_stats("response_cache", response_cache.stats)
+metrics.register_stats("order_book", order_book.stats)
+metrics.register_stats("scheduler", scheduler.stats, labels={"jobs": "job"})
 
-    def disconnect(self, websocket: WebSocket, room_id: str):
-        if room_id in self.active_connections:
-            self.active_connections[room_id].remove(websocket)
-            if not self.active_connections[room_id]:
-                del self.active_connections[room_id]
+security = HTTPBearer()
 
-    async def broadcast(self, message: str, room_id: str):
-        if room_id in self.active_connections:
-            for connection in self.active_connections[room_id]:
-                await connection.send_text(message)
+def response_columns(model, schema) -> list:
+    """The columns of `model` that `schema` serializes, in field order."""
+    return [getattr(model, field) for field in schema.model_fields]
 
-manager = ConnectionManager()
+# List endpoints select only what their response model needs and return plain row dicts:
+# no identity map, no lazy loads, and validation from dicts instead of ORM attributes
+USER_COLUMNS = response_columns(User, UserResponse)
+REVIEW_COLUMNS = response_columns(Review, ReviewResponse)
+LISTING_COLUMNS = response_columns(Listing, ListingResponse)
+MESSAGE_COLUMNS = response_columns(Message, MessageResponse)
+PURCHASE_COLUMNS = response_columns(PurchaseHistory, PurchaseHistoryResponse)
 
-def get_current_user_ws(token: str = Query(...), db: Session = Depends(get_db)):
+async def get_current_user_ws(token: str, db: AsyncSession):
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
-    user = db.query(User).filter(User.email == email).first()
+    user = await resolve_principal(payload, db)
     if user is None:
         raise HTTPException(status_code=401, detail="User not found")
     return user
 
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics(request: Request):
+    return metrics.metrics_response(request)
+
 @app.get("/")
 async def root():
     logger.info("Root endpoint accessed")
@@ -96,28 +165,28 @@ async def root():
 
 # Auth endpoints
 @app.post("/register", response_model=UserResponse)
-async def register(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.email == user.email).first()
+async def register(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    db_user = await db.scalar(select(User).where(User.email == user.email))
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
-    db_user = db.query(User).filter(User.username == user.username).first()
+    db_user = await db.scalar(select(User).where(User.username == user.username))
     if db_user:
         raise HTTPException(status_code=400, detail="Username already taken")
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await password_hasher.hash(user.password)
     db_user = User(email=user.email, username=user.username, password_hash=hashed_password)
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 @app.post("/login", response_model=Token)
-async def login(user: UserLogin, db: Session = Depends(get_db)):
-    db_user = authenticate_user(db, user.email, user.password)
+async def login(user: UserLogin, db: AsyncSession = Depends(get_async_db)):
+    db_user = await authenticate_user(db, user.email, user.password)
     if not db_user:
         raise HTTPException(status_code=400, detail="Incorrect email or password")
     access_token_expires = timedelta(minutes=30)
     access_token = create_access_token(
-        data={"sub": db_user.email}, expires_delta=access_token_expires
+        data=token_claims(db_user), expires_delta=access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
@@ -127,216 +196,379 @@ async def logout():
     return {"message": "Logged out successfully"}
 
 @app.get("/users/me", response_model=UserResponse)
-async def read_users_me(current_user: User = Depends(get_current_user)):
+async def read_users_me(current_user: Principal = Depends(get_current_user)):
     return current_user
 
 @app.put("/users/me/language", response_model=UserResponse)
-async def update_user_language(language_update: UserLanguageUpdate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    current_user.language = language_update.language
-    db.commit()
-    db.refresh(current_user)
-    return current_user
+async def update_user_language(language_update: UserLanguageUpdate, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    user = await db.get(User, current_user.id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    user.language = language_update.language
+    await db.commit()
+    await db.refresh(user)
+    invalidate_principal(user.id)
+    return user
 
 # Users CRUD
 @app.get("/users", response_model=List[UserResponse])
-async def get_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    users = db.query(User).offset(skip).limit(limit).all()
-    return users
+async def get_users(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(select(*USER_COLUMNS).offset(skip).limit(limit))
+    return [row._asdict() for row in result]
+
+MAX_REPUTATION_BATCH = 100
+
+@app.get("/users/reputation", response_model=List[SellerReputationResponse])
+async def get_users_reputation(user_ids: List[int] = Query(...), db: AsyncSession = Depends(get_async_db)):
+    if len(user_ids) > MAX_REPUTATION_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_REPUTATION_BATCH} user ids per request")
+    result = await db.execute(select(SellerStats).where(SellerStats.seller_id.in_(user_ids)))
+    stats = {row.seller_id: row for row in result.scalars().all()}
+    reputations = []
+    for user_id in dict.fromkeys(user_ids):
+        row = stats.get(user_id)
+        review_count = row.review_count if row else 0
+        reputations.append({
+            "user_id": user_id,
+            "average_rating": row.rating_sum / review_count if review_count else 0.0,
+            "review_count": review_count,
+            "likes_count": row.likes_count if row else 0,
+        })
+    return reputations
 
 @app.get("/users/{user_id}", response_model=UserResponse)
-async def get_user(user_id: int, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
+async def get_user(user_id: int, db: AsyncSession = Depends(get_async_db)):
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
 @app.put("/users/{user_id}", response_model=UserResponse)
-async def update_user(user_id: int, user_update: UserCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def update_user(user_id: int, user_update: UserCreate, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
     if current_user.id != user_id:
         raise HTTPException(status_code=403, detail="Not authorized")
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     user.email = user_update.email
     user.username = user_update.username
     if user_update.password:
-        user.password_hash = get_password_hash(user_update.password)
-    db.commit()
-    db.refresh(user)
+        user.password_hash = await password_hasher.hash(user_update.password)
+    await db.commit()
+    await db.refresh(user)
+    invalidate_principal(user.id)
     return user
 
 @app.delete("/users/{user_id}")
-async def delete_user(user_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def delete_user(user_id: int, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
     if current_user.id != user_id:
         raise HTTPException(status_code=403, detail="Not authorized")
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    db.delete(user)
-    db.commit()
+    await apply_seller_verification(db, user_id, False)
+    await db.execute(delete(SellerStats).where(SellerStats.seller_id == user_id))
+    await db.delete(user)
+    await db.commit()
+    invalidate_principal(user_id)
+    await response_cache.invalidate("listings", f"seller:{user_id}")
     return {"message": "User deleted"}
 
 # Profiles CRUD
 @app.post("/profiles", response_model=ProfileResponse)
-async def create_profile(profile: ProfileCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    if current_user.profile:
+async def create_profile(profile: ProfileCreate, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    if await db.get(Profile, current_user.id):
         raise HTTPException(status_code=400, detail="Profile already exists")
     db_profile = Profile(**profile.dict(), user_id=current_user.id)
     db.add(db_profile)
-    db.commit()
-    db.refresh(db_profile)
+    await db.commit()
+    await db.refresh(db_profile)
     return db_profile
 
 @app.get("/profiles/me", response_model=ProfileResponse)
-async def get_my_profile(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    if not current_user.profile:
+async def get_my_profile(current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    profile = await db.get(Profile, current_user.id)
+    if not profile:
         raise HTTPException(status_code=404, detail="Profile not found")
-    return current_user.profile
+    return profile
 
 @app.put("/profiles/me", response_model=ProfileResponse)
-async def update_profile(profile_update: ProfileUpdate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    if not current_user.profile:
+async def update_profile(profile_update: ProfileUpdate, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    profile = await db.get(Profile, current_user.id)
+    if not profile:
         raise HTTPException(status_code=404, detail="Profile not found")
     for key, value in profile_update.dict(exclude_unset=True).items():
-        setattr(current_user.profile, key, value)
-    db.commit()
-    db.refresh(current_user.profile)
-    return current_user.profile
+        setattr(profile, key, value)
+    await db.commit()
+    await db.refresh(profile)
+    return profile
 
 @app.delete("/profiles/me")
-async def delete_profile(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    if not current_user.profile:
+async def delete_profile(current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    profile = await db.get(Profile, current_user.id)
+    if not profile:
         raise HTTPException(status_code=404, detail="Profile not found")
-    db.delete(current_user.profile)
-    db.commit()
+    await db.delete(profile)
+    await db.commit()
     return {"message": "Profile deleted"}
 
 # Servers CRUD
 @app.post("/servers", response_model=ServerResponse)
-async def create_server(server: ServerCreate, db: Session = Depends(get_db)):
+async def create_server(server: ServerCreate, db: AsyncSession = Depends(get_async_db)):
     db_server = Server(**server.dict())
     db.add(db_server)
-    db.commit()
-    db.refresh(db_server)
+    await db.commit()
+    await response_cache.invalidate("servers")
+    await db.refresh(db_server)
     return db_server
 
 @app.get("/servers", response_model=List[ServerResponse])
-async def get_servers(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    servers = db.query(Server).offset(skip).limit(limit).all()
-    return servers
+@response_cache.cached("servers")
+async def get_servers(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(select(Server).offset(skip).limit(limit))
+    return result.scalars().all()
+
+@app.get("/servers/activity", response_model=List[ServerActivityResponse])
+@response_cache.cached("servers", "listings", "purchases")
+async def get_servers_activity(db: AsyncSession = Depends(get_async_db)):
+    # Served from server_stats, which stats.py keeps current as listings and purchases change
+    query = select(
+        Server.id,
+        Server.name,
+        Server.chronicle,
+        ServerStats.active_listings,
+        ServerStats.total_transactions,
+        ServerStats.total_sellers
+    ).join(ServerStats, ServerStats.server_id == Server.id)\
+     .where(ServerStats.active_listings > 0)\
+     .order_by(ServerStats.activity_score.desc())
+
+    result = await db.execute(query)
+    return result.all()
 
 @app.get("/servers/{server_id}", response_model=ServerResponse)
-async def get_server(server_id: int, db: Session = Depends(get_db)):
-    server = db.query(Server).filter(Server.id == server_id).first()
+@response_cache.cached("servers")
+async def get_server(server_id: int, db: AsyncSession = Depends(get_async_db)):
+    server = await db.get(Server, server_id)
     if not server:
         raise HTTPException(status_code=404, detail="Server not found")
     return server
 
+@app.get("/servers/{server_id}/order-book", response_model=OrderBookResponse)
+async def get_server_order_book(server_id: int, type: Optional[ListingType] = None, depth: int = Query(20, ge=1, le=200)):
+    # Served from the in-memory book, no database round trip
+    return order_book.snapshot(server_id, type.value if type else None, depth)
+
+@app.get("/servers/{server_id}/price-history", response_model=List[PriceBucketResponse])
+async def get_server_price_history(
+    server_id: int,
+    type: ListingType = ListingType.SELL,
+    source: str = "listing",
+    resolution: str = "1h",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = Query(200, ge=1, le=1000),
+    db: AsyncSession = Depends(get_async_db)
+):
+    if resolution not in RESOLUTIONS:
+        raise HTTPException(status_code=400, detail=f"resolution must be one of {', '.join(RESOLUTIONS)}")
+    if source not in SOURCES:
+        raise HTTPException(status_code=400, detail=f"source must be one of {', '.join(SOURCES)}")
+    # Reads pre-aggregated buckets only, so cost depends on `limit`, not on history length
+    return await price_history(db, server_id, type.value, source, resolution, start, end, limit)
+
 @app.put("/servers/{server_id}", response_model=ServerResponse)
-async def update_server(server_id: int, server_update: ServerCreate, db: Session = Depends(get_db)):
-    server = db.query(Server).filter(Server.id == server_id).first()
+async def update_server(server_id: int, server_update: ServerCreate, db: AsyncSession = Depends(get_async_db)):
+    server = await db.get(Server, server_id)
     if not server:
         raise HTTPException(status_code=404, detail="Server not found")
     for key, value in server_update.dict(exclude_unset=True).items():
         setattr(server, key, value)
-    db.commit()
-    db.refresh(server)
+    await db.commit()
+    await response_cache.invalidate("servers")
+    await db.refresh(server)
     return server
 
 @app.delete("/servers/{server_id}")
-async def delete_server(server_id: int, db: Session = Depends(get_db)):
-    server = db.query(Server).filter(Server.id == server_id).first()
+async def delete_server(server_id: int, db: AsyncSession = Depends(get_async_db)):
+    server = await db.get(Server, server_id)
     if not server:
         raise HTTPException(status_code=404, detail="Server not found")
-    db.delete(server)
-    db.commit()
+    await db.execute(delete(ServerStats).where(ServerStats.server_id == server_id))
+    await db.delete(server)
+    await db.commit()
+    order_book.remove_server(server_id)
+    await response_cache.invalidate("servers", "listings")
     return {"message": "Server deleted"}
 
-@app.get("/servers/activity", response_model=List[ServerActivityResponse])
-async def get_servers_activity(db: Session = Depends(get_db)):
-    query = db.query(
-        Server.id,
-        Server.name,
-        Server.chronicle,
-        func.count(Listing.id).label('active_listings'),
-        func.count(PurchaseHistory.id).label('total_transactions'),
-        func.count(func.distinct(User.id)).label('total_sellers')
-    ).join(Listing, Server.id == Listing.server_id)\
-     .join(User, Listing.seller_id == User.id)\
-     .outerjoin(PurchaseHistory, Listing.id == PurchaseHistory.listing_id)\
-     .filter(Listing.status == "ACTIVE")\
-     .filter(User.is_verified == True)\
-     .group_by(Server.id, Server.name, Server.chronicle)\
-     .order_by((func.count(Listing.id) + func.count(PurchaseHistory.id)).desc())
-
-    results = query.all()
-    return results
-
 # Reviews CRUD
 @app.post("/reviews", response_model=ReviewResponse)
-async def create_review(review: ReviewCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def create_review(review: ReviewCreate, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
     db_review = Review(**review.dict(), reviewer_id=current_user.id)
     db.add(db_review)
-    db.commit()
-    db.refresh(db_review)
+    await adjust_seller_stats(db, db_review.reviewee_id, rating_sum=db_review.rating, review_count=1)
+    await db.commit()
+    await response_cache.invalidate(f"seller:{db_review.reviewee_id}")
+    await db.refresh(db_review)
     return db_review
 
 @app.get("/reviews", response_model=List[ReviewResponse])
-async def get_reviews(listing_id: Optional[int] = None, reviewer_id: Optional[int] = None, reviewee_id: Optional[int] = None, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    query = db.query(Review)
+async def get_reviews(listing_id: Optional[int] = None, reviewer_id: Optional[int] = None, reviewee_id: Optional[int] = None, skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_async_db)):
+    query = select(*REVIEW_COLUMNS)
     if listing_id:
-        query = query.filter(Review.listing_id == listing_id)
+        query = query.where(Review.listing_id == listing_id)
     if reviewer_id:
-        query = query.filter(Review.reviewer_id == reviewer_id)
+        query = query.where(Review.reviewer_id == reviewer_id)
     if reviewee_id:
-        query = query.filter(Review.reviewee_id == reviewee_id)
-    reviews = query.offset(skip).limit(limit).all()
-    return reviews
+        query = query.where(Review.reviewee_id == reviewee_id)
+    result = await db.execute(query.offset(skip).limit(limit))
+    return [row._asdict() for row in result]
 
 @app.get("/reviews/{review_id}", response_model=ReviewResponse)
-async def get_review(review_id: int, db: Session = Depends(get_db)):
-    review = db.query(Review).filter(Review.id == review_id).first()
+async def get_review(review_id: int, db: AsyncSession = Depends(get_async_db)):
+    review = await db.get(Review, review_id)
     if not review:
         raise HTTPException(status_code=404, detail="Review not found")
     return review
 
 @app.put("/reviews/{review_id}", response_model=ReviewResponse)
-async def update_review(review_id: int, review_update: ReviewCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    review = db.query(Review).filter(Review.id == review_id).first()
+async def update_review(review_id: int, review_update: ReviewCreate, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    review = await db.get(Review, review_id)
     if not review:
         raise HTTPException(status_code=404, detail="Review not found")
     if review.reviewer_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized")
+    previous_reviewee_id, previous_rating = review.reviewee_id, review.rating
     for key, value in review_update.dict(exclude_unset=True).items():
         setattr(review, key, value)
-    db.commit()
-    db.refresh(review)
+    await adjust_seller_stats(db, previous_reviewee_id, rating_sum=-previous_rating, review_count=-1)
+    await adjust_seller_stats(db, review.reviewee_id, rating_sum=review.rating, review_count=1)
+    await db.commit()
+    await response_cache.invalidate(f"seller:{previous_reviewee_id}", f"seller:{review.reviewee_id}")
+    await db.refresh(review)
     return review
 
 @app.delete("/reviews/{review_id}")
-async def delete_review(review_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    review = db.query(Review).filter(Review.id == review_id).first()
+async def delete_review(review_id: int, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    review = await db.get(Review, review_id)
     if not review:
         raise HTTPException(status_code=404, detail="Review not found")
     if review.reviewer_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized")
-    db.delete(review)
-    db.commit()
+    await db.delete(review)
+    await adjust_seller_stats(db, review.reviewee_id, rating_sum=-review.rating, review_count=-1)
+    await db.commit()
+    await response_cache.invalidate(f"seller:{review.reviewee_id}")
     return {"message": "Review deleted"}
 
 # Listings (Ads) CRUD
 @app.post("/listings", response_model=ListingResponse)
-async def create_listing(listing: ListingCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def create_listing(listing: ListingCreate, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
     if not current_user.is_verified:
         raise HTTPException(status_code=403, detail="Only verified sellers can create listings")
     db_listing = Listing(**listing.dict(), seller_id=current_user.id)
     db.add(db_listing)
-    db.commit()
-    db.refresh(db_listing)
+    await record_price_events(db, [listing_event(db_listing)])
+    await db.flush()
+    await apply_listing_changes(db, [(None, ListingState.of(db_listing))])
+    await db.commit()
+    await response_cache.invalidate("listings")
+    await db.refresh(db_listing)
+    order_book.apply(db_listing)
     return db_listing
 
-@app.get("/listings", response_model=List[ListingResponse])
-async def get_listings(
+MAX_LISTING_BULK = 100
+
+@app.post("/listings/bulk", response_model=List[ListingBulkResult])
+async def create_listings_bulk(bulk: ListingBulkCreate, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    if not current_user.is_verified:
+        raise HTTPException(status_code=403, detail="Only verified sellers can create listings")
+    if not 0 < len(bulk.items) <= MAX_LISTING_BULK:
+        raise HTTPException(status_code=400, detail=f"Between 1 and {MAX_LISTING_BULK} listings per request")
+    requested_servers = {item.server_id for item in bulk.items}
+    result = await db.execute(select(Server.id).where(Server.id.in_(requested_servers)))
+    known_servers = set(result.scalars().all())
+
+    results = [ListingBulkResult(index=index, status="invalid", detail="Server not found") for index in range(len(bulk.items))]
+    accepted = [index for index, item in enumerate(bulk.items) if item.server_id in known_servers]
+    if accepted:
+        # One multi-row INSERT ... RETURNING, rows come back in parameter order
+        created = await db.scalars(
+            insert(Listing).returning(Listing, sort_by_parameter_order=True),
+            [{**bulk.items[index].dict(), "seller_id": current_user.id} for index in accepted],
+        )
+        created = created.all()
+        for index, listing in zip(accepted, created):
+            results[index] = ListingBulkResult(index=index, status="created", listing=ListingResponse.model_validate(listing))
+        await record_price_events(db, [listing_event(listing) for listing in created])
+        await apply_listing_changes(db, [(None, ListingState.of(listing)) for listing in created])
+        await db.commit()
+        await response_cache.invalidate("listings")
+        for listing in created:
+            order_book.apply(listing)
+    return results
+
+@app.patch("/listings/bulk", response_model=List[ListingBulkResult])
+async def update_listings_bulk(bulk: ListingBulkUpdate, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    if not 0 < len(bulk.items) <= MAX_LISTING_BULK:
+        raise HTTPException(status_code=400, detail=f"Between 1 and {MAX_LISTING_BULK} listings per request")
+    result = await db.execute(
+        select(Listing.id, Listing.seller_id, Listing.server_id, Listing.status, Listing.price).where(Listing.id.in_({item.id for item in bulk.items}))
+    )
+    owners = {row.id: row for row in result.all()}
+    requested_servers = {item.server_id for item in bulk.items}
+    result = await db.execute(select(Server.id).where(Server.id.in_(requested_servers)))
+    known_servers = set(result.scalars().all())
+
+    results = []
+    changes = {}
+    for index, item in enumerate(bulk.items):
+        row = owners.get(item.id)
+        if row is None:
+            results.append(ListingBulkResult(index=index, status="not_found", detail="Listing not found"))
+        elif row.seller_id != current_user.id:
+            results.append(ListingBulkResult(index=index, status="forbidden", detail="Not authorized"))
+        elif item.server_id not in known_servers:
+            results.append(ListingBulkResult(index=index, status="invalid", detail="Server not found"))
+        else:
+            results.append(ListingBulkResult(index=index, status="updated"))
+            # A listing repeated in the batch keeps its last set of changes
+            changes.setdefault(item.id, {"id": item.id}).update(item.dict(exclude_unset=True))
+    if changes:
+        # ORM bulk UPDATE by primary key: executemany, grouped by the set of columns changed
+        await db.execute(update(Listing), list(changes.values()))
+        result = await db.execute(select(Listing).where(Listing.id.in_(changes.keys())))
+        listings = {listing.id: listing for listing in result.scalars().all()}
+        await apply_listing_changes(db, [
+            (ListingState(row.id, row.server_id, row.seller_id, row.status), ListingState.of(listings[row.id]))
+            for row in (owners[listing_id] for listing_id in changes)
+        ])
+        await record_price_events(db, [
+            listing_event(listing) for listing in listings.values()
+            if listing.status == "ACTIVE" and listing.price != owners[listing.id].price
+        ])
+        await db.commit()
+        await response_cache.invalidate("listings")
+        for listing in listings.values():
+            order_book.apply(listing)
+        for item, item_result in zip(bulk.items, results):
+            if item_result.status == "updated":
+                item_result.listing = ListingResponse.model_validate(listings[item.id])
+    return results
+
+def encode_listing_cursor(listing) -> str:
+    raw = json.dumps([bool(listing.is_featured), listing.created_at.isoformat(), listing.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_listing_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        is_featured, created_at, listing_id = json.loads(base64.urlsafe_b64decode(padded))
+        return bool(is_featured), datetime.fromisoformat(created_at), int(listing_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def listings_query(
     seller_id: Optional[int] = None,
     server_id: Optional[int] = None,
     chronicle: Optional[str] = None,
@@ -346,119 +578,210 @@ async def get_listings(
     quantity_min: Optional[int] = None,
     quantity_max: Optional[int] = None,
     description_search: Optional[str] = None,
-    skip: int = 0,
-    limit: int = 10,
-    db: Session = Depends(get_db)
+    sort: Optional[str] = None,
+    dialect: Optional[str] = None,
 ):
-    query = db.query(Listing).filter(Listing.status == "ACTIVE")
+    """Filtered, feed-ordered SELECT behind GET /listings (also used by the EXPLAIN checks)."""
+    full_text = (dialect or async_engine.dialect.name) == "postgresql"
+    search_query = None
+    # Inline the literal so partial indexes (WHERE status = 'ACTIVE') stay usable with generic plans
+    query = select(*LISTING_COLUMNS).where(Listing.status == literal("ACTIVE", literal_execute=True))
     if seller_id:
-        query = query.filter(Listing.seller_id == seller_id)
+        query = query.where(Listing.seller_id == seller_id)
     if server_id:
-        query = query.filter(Listing.server_id == server_id)
+        query = query.where(Listing.server_id == server_id)
     if chronicle:
-        query = query.filter(Listing.chronicle.ilike(f"%{chronicle}%"))
+        # Served by the chronicle trigram index on Postgres
+        query = query.where(Listing.chronicle.ilike(f"%{chronicle}%"))
     if type:
-        query = query.filter(Listing.type == type)
+        query = query.where(Listing.type == type)
     if price_min is not None:
-        query = query.filter(Listing.price >= price_min)
+        query = query.where(Listing.price >= price_min)
     if price_max is not None:
-        query = query.filter(Listing.price <= price_max)
+        query = query.where(Listing.price <= price_max)
     if quantity_min is not None:
-        query = query.filter(Listing.quantity >= quantity_min)
+        query = query.where(Listing.quantity >= quantity_min)
     if quantity_max is not None:
-        query = query.filter(Listing.quantity <= quantity_max)
-    if description_search:
-        query = query.filter(Listing.description.ilike(f"%{description_search}%"))
-    # Sort by featured first, then by created_at desc
-    query = query.order_by(Listing.is_featured.desc(), Listing.created_at.desc())
-    listings = query.offset(skip).limit(limit).all()
-    return listings
+        query = query.where(Listing.quantity <= quantity_max)
+    if description_search and full_text:
+        # Word matches via the tsvector index, substring matches via the trigram index
+        search_query = func.websearch_to_tsquery("simple", description_search)
+        query = query.where(or_(
+            LISTING_SEARCH_DOCUMENT.op("@@")(search_query),
+            Listing.description.ilike(f"%{description_search}%"),
+        ))
+    elif description_search:
+        # SQLite and other dialects: plain substring match, no ranking
+        query = query.where(Listing.description.ilike(f"%{description_search}%"))
+    if sort == "relevance" and search_query is not None:
+        return query.order_by(
+            Listing.is_featured.desc(),
+            func.ts_rank(LISTING_SEARCH_DOCUMENT, search_query).desc(),
+            Listing.created_at.desc(),
+            Listing.id.desc(),
+        )
+    # Sort by featured first, then by created_at desc (id keeps the order total)
+    return query.order_by(Listing.is_featured.desc(), Listing.created_at.desc(), Listing.id.desc())
+
+@app.get("/listings", response_model=List[ListingResponse])
+@response_cache.cached("listings")
+async def get_listings(
+    response: Response,
+    seller_id: Optional[int] = None,
+    server_id: Optional[int] = None,
+    chronicle: Optional[str] = None,
+    type: Optional[str] = None,
+    price_min: Optional[float] = None,
+    price_max: Optional[float] = None,
+    quantity_min: Optional[int] = None,
+    quantity_max: Optional[int] = None,
+    description_search: Optional[str] = None,
+    sort: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 10,
+    after: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    if sort not in (None, "recent", "relevance"):
+        raise HTTPException(status_code=400, detail="sort must be 'recent' or 'relevance'")
+    if sort == "relevance" and after:
+        raise HTTPException(status_code=400, detail="Cursor pagination is not available for relevance sort")
+    query = listings_query(
+        seller_id=seller_id, server_id=server_id, chronicle=chronicle, type=type,
+        price_min=price_min, price_max=price_max, quantity_min=quantity_min,
+        quantity_max=quantity_max, description_search=description_search, sort=sort,
+    )
+    if after:
+        # Keyset mode: continue strictly after the last row of the previous page
+        query = query.where(
+            tuple_(Listing.is_featured, Listing.created_at, Listing.id) < tuple_(*decode_listing_cursor(after))
+        )
+    else:
+        query = query.offset(skip)
+    result = await db.execute(query.limit(limit))
+    listings = result.all()
+    if sort != "relevance" and listings and len(listings) == limit:
+        response.headers["X-Next-Cursor"] = encode_listing_cursor(listings[-1])
+    return [row._asdict() for row in listings]
 
 @app.get("/listings/{listing_id}", response_model=ListingResponse)
-async def get_listing(listing_id: int, db: Session = Depends(get_db)):
-    listing = db.query(Listing).filter(Listing.id == listing_id).first()
+async def get_listing(listing_id: int, db: AsyncSession = Depends(get_async_db)):
+    listing = await db.get(Listing, listing_id)
     if not listing:
         raise HTTPException(status_code=404, detail="Listing not found")
     return listing
 
 @app.put("/listings/{listing_id}", response_model=ListingResponse)
-async def update_listing(listing_id: int, listing_update: ListingUpdate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    listing = db.query(Listing).filter(Listing.id == listing_id).first()
+async def update_listing(listing_id: int, listing_update: ListingUpdate, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    listing = await db.get(Listing, listing_id)
     if not listing:
         raise HTTPException(status_code=404, detail="Listing not found")
     if listing.seller_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized")
+    previous, previous_price = ListingState.of(listing), listing.price
     for key, value in listing_update.dict(exclude_unset=True).items():
         setattr(listing, key, value)
-    db.commit()
-    db.refresh(listing)
+    if listing.price != previous_price and listing.status == "ACTIVE":
+        await record_price_events(db, [listing_event(listing)])
+    await apply_listing_changes(db, [(previous, ListingState.of(listing))])
+    await db.commit()
+    await response_cache.invalidate("listings")
+    await db.refresh(listing)
+    order_book.apply(listing)
     return listing
 
 @app.delete("/listings/{listing_id}")
-async def delete_listing(listing_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    listing = db.query(Listing).filter(Listing.id == listing_id).first()
+async def delete_listing(listing_id: int, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    listing = await db.get(Listing, listing_id)
     if not listing:
         raise HTTPException(status_code=404, detail="Listing not found")
     if listing.seller_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized")
-    db.delete(listing)
-    db.commit()
+    await apply_listing_changes(db, [(ListingState.of(listing), None)])
+    await db.delete(listing)
+    await db.commit()
+    await response_cache.invalidate("listings")
+    order_book.remove(listing_id)
     return {"message": "Listing deleted"}
 
 # Messages CRUD
 @app.post("/messages", response_model=MessageResponse)
-async def create_message(message: MessageCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def create_message(message: MessageCreate, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    if not await chat_room_is_valid(db, message.room_id):
+        raise HTTPException(status_code=404, detail="Chat room not found")
     db_message = Message(**message.dict(), sender_id=current_user.id)
     db.add(db_message)
-    db.commit()
-    db.refresh(db_message)
+    await db.flush()
+    await record_chat_message(db, db_message)
+    await db.commit()
+    await db.refresh(db_message)
     return db_message
 
 @app.get("/messages", response_model=List[MessageResponse])
-async def get_messages(room_id: Optional[str] = None, sender_id: Optional[int] = None, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    query = db.query(Message)
+async def get_messages(
+    room_id: Optional[str] = None,
+    sender_id: Optional[int] = None,
+    before: Optional[int] = None,
+    after: Optional[int] = None,
+    skip: int = 0,
+    limit: int = 100,
+    db: AsyncSession = Depends(get_async_db)
+):
+    query = select(*MESSAGE_COLUMNS)
     if room_id:
-        query = query.filter(Message.room_id == room_id)
+        query = query.where(Message.room_id == room_id)
     if sender_id:
-        query = query.filter(Message.sender_id == sender_id)
-    messages = query.offset(skip).limit(limit).all()
-    return messages
+        query = query.where(Message.sender_id == sender_id)
+    # Cursor pages are range scans on (room_id, id); results are always oldest first.
+    # skip counts from the cursor: past `after` forwards, back from `before` (or the newest message)
+    if after is not None:
+        result = await db.execute(query.where(Message.id > after).order_by(Message.id.asc()).offset(skip).limit(limit))
+        # Stop before messages that lower ids could still be committed behind, so polling never skips one
+        return message_writer.settled([row._asdict() for row in result])
+    if before is not None or room_id:
+        if before is not None:
+            query = query.where(Message.id < before)
+        result = await db.execute(query.order_by(Message.id.desc()).offset(skip).limit(limit))
+        return [row._asdict() for row in reversed(result.all())]
+    result = await db.execute(query.order_by(Message.id.asc()).offset(skip).limit(limit))
+    return [row._asdict() for row in result]
 
 @app.get("/messages/{message_id}", response_model=MessageResponse)
-async def get_message(message_id: int, db: Session = Depends(get_db)):
-    message = db.query(Message).filter(Message.id == message_id).first()
+async def get_message(message_id: int, db: AsyncSession = Depends(get_async_db)):
+    message = await db.get(Message, message_id)
     if not message:
         raise HTTPException(status_code=404, detail="Message not found")
     return message
 
 @app.put("/messages/{message_id}", response_model=MessageResponse)
-async def update_message(message_id: int, message_update: MessageCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    message = db.query(Message).filter(Message.id == message_id).first()
+async def update_message(message_id: int, message_update: MessageCreate, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    message = await db.get(Message, message_id)
     if not message:
         raise HTTPException(status_code=404, detail="Message not found")
     if message.sender_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized")
     for key, value in message_update.dict(exclude_unset=True).items():
         setattr(message, key, value)
-    db.commit()
-    db.refresh(message)
+    await db.commit()
+    await db.refresh(message)
     return message
 
 @app.delete("/messages/{message_id}")
-async def delete_message(message_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    message = db.query(Message).filter(Message.id == message_id).first()
+async def delete_message(message_id: int, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    message = await db.get(Message, message_id)
     if not message:
         raise HTTPException(status_code=404, detail="Message not found")
     if message.sender_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized")
-    db.delete(message)
-    db.commit()
+    await db.delete(message)
+    await forget_chat_message(db, message)
+    await db.commit()
     return {"message": "Message deleted"}
 
 # Chat endpoints
 @app.post("/chat/start")
-async def start_chat(listing_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    listing = db.query(Listing).filter(Listing.id == listing_id).first()
+async def start_chat(listing_id: int, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    listing = await db.get(Listing, listing_id)
     if not listing:
         raise HTTPException(status_code=404, detail="Listing not found")
     seller_id = listing.seller_id
@@ -468,90 +791,148 @@ async def start_chat(listing_id: int, current_user: User = Depends(get_current_u
     return {"room_id": room_id}
 
 @app.get("/chat/rooms")
-async def get_chat_rooms(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    # Get all messages where user is sender or in room_id
-    messages = db.query(Message).filter(
-        (Message.sender_id == current_user.id) |
-        (Message.room_id.like(f"%_{current_user.id}_%")) |
-        (Message.room_id.like(f"%_{current_user.id}"))
-    ).order_by(Message.created_at.desc()).all()
-    rooms = {}
-    for msg in messages:
-        if msg.room_id not in rooms:
-            # Parse other user
-            parts = msg.room_id.split('_')
-            listing_id = int(parts[0])
-            buyer_id = int(parts[1])
-            seller_id = int(parts[2])
-            other_user_id = seller_id if current_user.id == buyer_id else buyer_id
-            other_user = db.query(User).filter(User.id == other_user_id).first()
-            rooms[msg.room_id] = {
-                "room_id": msg.room_id,
-                "other_user": other_user.username if other_user else "Unknown",
-                "last_message": msg.content,
-                "last_message_time": msg.created_at.isoformat()
-            }
-    return list(rooms.values())
+async def get_chat_rooms(current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    # One indexed read of chat_rooms, joined to the other participant and the last message
+    is_buyer = ChatRoom.buyer_id == current_user.id
+    other_user_id = case((is_buyer, ChatRoom.seller_id), else_=ChatRoom.buyer_id)
+    unread = case((is_buyer, ChatRoom.buyer_unread), else_=ChatRoom.seller_unread)
+    result = await db.execute(
+        select(ChatRoom.room_id, ChatRoom.last_message_at, User.username, Message.content, unread.label("unread_count"))
+        .outerjoin(User, User.id == other_user_id)
+        .outerjoin(Message, Message.id == ChatRoom.last_message_id)
+        .where(or_(ChatRoom.buyer_id == current_user.id, ChatRoom.seller_id == current_user.id))
+        .where(ChatRoom.last_message_id.isnot(None))
+        .order_by(ChatRoom.last_message_at.desc())
+    )
+    return [
+        {
+            "room_id": row.room_id,
+            "other_user": row.username or "Unknown",
+            "last_message": row.content,
+            "last_message_time": row.last_message_at.isoformat(),
+            "unread_count": row.unread_count,
+        }
+        for row in result.all()
+    ]
+
+@app.post("/chat/rooms/{room_id}/read")
+async def mark_chat_room_read(room_id: str, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    room = await db.get(ChatRoom, room_id)
+    if not room:
+        raise HTTPException(status_code=404, detail="Room not found")
+    if current_user.id == room.buyer_id:
+        room.buyer_unread = 0
+    elif current_user.id == room.seller_id:
+        room.seller_unread = 0
+    else:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    await db.commit()
+    return {"message": "Room marked as read"}
+
+def chat_event(message: dict, sender_username: Optional[str]) -> str:
+    return json.dumps({
+        "id": message["id"],
+        "room_id": message["room_id"],
+        "sender_id": message["sender_id"],
+        "sender_username": sender_username,
+        "content": message["content"],
+        "created_at": message["created_at"].isoformat()
+    })
+
+async def replay_messages(websocket: WebSocket, room_id: str, since: int):
+    """Send what a reconnecting client missed: stored messages plus any still being written."""
+    # Messages other workers accepted before this socket joined are stored within the commit window
+    await asyncio.sleep(message_writer.commit_window)
+    async with AsyncSessionLocal() as db:
+        # Another worker's older id block can give a message an id below `since` although it was
+        # sent after it; resend those too (clients de-duplicate by id)
+        since_at = await db.scalar(select(Message.created_at).where(Message.id == since))
+        newer = Message.id > since
+        if since_at is not None:
+            newer = or_(newer, Message.created_at > since_at)
+        result = await db.execute(
+            select(Message.id, Message.room_id, Message.sender_id, Message.content, Message.created_at, User.username)
+            .outerjoin(User, User.id == Message.sender_id)
+            .where(Message.room_id == room_id, newer)
+            .order_by(Message.id.asc())
+            .limit(CHAT_REPLAY_LIMIT)
+        )
+        rows = result.all()
+        events = {row.id: chat_event(row._asdict(), row.username) for row in rows}
+        pending = message_writer.pending_since(room_id, since, since_at)
+        usernames = {row.sender_id: row.username for row in rows}
+        missing = {m["sender_id"] for m in pending} - usernames.keys()
+        if missing:
+            result = await db.execute(select(User.id, User.username).where(User.id.in_(missing)))
+            usernames.update(result.all())
+    for message in pending:
+        events.setdefault(message["id"], chat_event(message, usernames.get(message["sender_id"])))
+    for message_id in sorted(events)[:CHAT_REPLAY_LIMIT]:
+        await websocket.send_text(events[message_id])
 
 @app.websocket("/ws/chat/{room_id}")
-async def websocket_chat(websocket: WebSocket, room_id: str, token: str = Query(...), db: Session = Depends(get_db)):
-    user = get_current_user_ws(token, db)
-    # Check access
-    if not user.is_admin:
-        # Parse room_id: listing_id_buyer_id_seller_id
-        try:
-            parts = room_id.split('_')
-            listing_id = int(parts[0])
-            buyer_id = int(parts[1])
-            seller_id = int(parts[2])
-            if user.id not in [buyer_id, seller_id]:
-                await websocket.close(code=1008)
-                return
-        except:
+async def websocket_chat(websocket: WebSocket, room_id: str, token: str = Query(...), since: Optional[int] = Query(None)):
+    # Borrow a session only to authenticate; it must not stay checked out for the socket's lifetime
+    connection_kind.set("websocket")
+    async with AsyncSessionLocal() as db:
+        user = await get_current_user_ws(token, db)
+        # Check access
+        allowed = True
+        if not user.is_admin:
+            # Parse room_id: listing_id_buyer_id_seller_id
+            parsed = parse_room_id(room_id)
+            allowed = parsed is not None and user.id in parsed[1:]
+        # The room's listing, seller and buyer must exist before anything is stored for it
+        if not allowed or not await chat_room_is_valid(db, room_id):
             await websocket.close(code=1008)
             return
-    await manager.connect(websocket, room_id)
+    # Register before replaying so nothing published in between is lost; clients de-duplicate by id
+    await manager.connect(websocket, room_id, paused=since is not None)
     try:
+        if since is not None:
+            await replay_messages(websocket, room_id, since)
+            manager.resume(websocket, room_id)
         while True:
             data = await websocket.receive_text()
             message_data = json.loads(data)
             content = message_data.get("content")
             if content:
-                # Save to DB
-                db_message = Message(room_id=room_id, sender_id=user.id, content=content)
-                db.add(db_message)
-                db.commit()
-                db.refresh(db_message)
+                # Persisted in the background; id and timestamp are final already
+                try:
+                    message = await message_writer.submit(room_id, user.id, content)
+                except WriterBacklogFull:
+                    # Storage is behind; the client should retry once it recovers
+                    await websocket.close(code=CLOSE_WRITER_BACKLOG)
+                    break
                 # Broadcast
-                await manager.broadcast(json.dumps({
-                    "id": db_message.id,
-                    "room_id": room_id,
-                    "sender_id": user.id,
-                    "sender_username": user.username,
-                    "content": content,
-                    "created_at": db_message.created_at.isoformat()
-                }), room_id)
+                await manager.broadcast(chat_event(message, user.username), room_id)
     except WebSocketDisconnect:
-        manager.disconnect(websocket, room_id)
+        pass
+    finally:
+        await manager.disconnect(websocket, room_id)
 
 # Purchase History CRUD
 @app.post("/purchase-history", response_model=PurchaseHistoryResponse)
-async def create_purchase_history(purchase: PurchaseHistoryResponse, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def create_purchase_history(purchase: PurchaseHistoryResponse, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
     # Assuming purchase is created when a transaction happens, but for now, allow manual creation
-    db_purchase = PurchaseHistory(**purchase.dict(), buyer_id=current_user.id)
+    db_purchase = PurchaseHistory(**purchase.dict(exclude={"buyer_id"}), buyer_id=current_user.id)
     db.add(db_purchase)
-    db.commit()
-    db.refresh(db_purchase)
+    listing = await db.get(Listing, db_purchase.listing_id)
+    await record_price_events(db, [listing_event(listing, source="trade", at=db_purchase.transaction_date)])
+    await apply_purchase(db, listing)
+    await db.commit()
+    await response_cache.invalidate("purchases")
+    await db.refresh(db_purchase)
     return db_purchase
 
 @app.get("/purchase-history/me", response_model=List[PurchaseHistoryResponse])
-async def get_my_purchase_history(skip: int = 0, limit: int = 100, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    purchases = db.query(PurchaseHistory).filter(PurchaseHistory.buyer_id == current_user.id).offset(skip).limit(limit).all()
-    return purchases
+async def get_my_purchase_history(skip: int = 0, limit: int = 100, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(select(*PURCHASE_COLUMNS).where(PurchaseHistory.buyer_id == current_user.id).offset(skip).limit(limit))
+    return [row._asdict() for row in result]
 
 @app.get("/purchase-history/{purchase_id}", response_model=PurchaseHistoryResponse)
-async def get_purchase_history(purchase_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    purchase = db.query(PurchaseHistory).filter(PurchaseHistory.id == purchase_id).first()
+async def get_purchase_history(purchase_id: int, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    purchase = await db.get(PurchaseHistory, purchase_id)
     if not purchase:
         raise HTTPException(status_code=404, detail="Purchase not found")
     if purchase.buyer_id != current_user.id:
@@ -560,57 +941,80 @@ async def get_purchase_history(purchase_id: int, current_user: User = Depends(ge
 
 # Seller Likes CRUD
 @app.post("/likes", response_model=SellerLikeResponse)
-async def like_seller(like: SellerLikeCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def like_seller(like: SellerLikeCreate, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
     # Check if already liked
-    existing_like = db.query(SellerLike).filter(SellerLike.buyer_id == current_user.id, SellerLike.seller_id == like.seller_id).first()
+    existing_like = await db.scalar(select(SellerLike).where(SellerLike.buyer_id == current_user.id, SellerLike.seller_id == like.seller_id))
     if existing_like:
         raise HTTPException(status_code=400, detail="Already liked")
     db_like = SellerLike(buyer_id=current_user.id, seller_id=like.seller_id)
     db.add(db_like)
-    db.commit()
-    db.refresh(db_like)
+    await adjust_seller_stats(db, like.seller_id, likes_count=1)
+    await db.commit()
+    await response_cache.invalidate(f"seller:{like.seller_id}")
+    await db.refresh(db_like)
     return db_like
 
 @app.delete("/likes/{seller_id}")
-async def unlike_seller(seller_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    like = db.query(SellerLike).filter(SellerLike.buyer_id == current_user.id, SellerLike.seller_id == seller_id).first()
+async def unlike_seller(seller_id: int, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    like = await db.scalar(select(SellerLike).where(SellerLike.buyer_id == current_user.id, SellerLike.seller_id == seller_id))
     if not like:
         raise HTTPException(status_code=404, detail="Like not found")
-    db.delete(like)
-    db.commit()
+    await db.delete(like)
+    await adjust_seller_stats(db, seller_id, likes_count=-1)
+    await db.commit()
+    await response_cache.invalidate(f"seller:{seller_id}")
     return {"message": "Unliked"}
 
 @app.get("/likes/me", response_model=List[SellerLikeResponse])
-async def get_my_likes(skip: int = 0, limit: int = 100, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    likes = db.query(SellerLike).filter(SellerLike.buyer_id == current_user.id).offset(skip).limit(limit).all()
-    return likes
+async def get_my_likes(skip: int = 0, limit: int = 100, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(select(SellerLike).where(SellerLike.buyer_id == current_user.id).offset(skip).limit(limit))
+    return result.scalars().all()
 
 @app.get("/users/{user_id}/likes-count")
-async def get_user_likes_count(user_id: int, db: Session = Depends(get_db)):
-    count = db.query(SellerLike).filter(SellerLike.seller_id == user_id).count()
-    return {"likes_count": count}
+@response_cache.cached("seller:{user_id}")
+async def get_user_likes_count(user_id: int, db: AsyncSession = Depends(get_async_db)):
+    stats = await db.get(SellerStats, user_id)
+    return {"likes_count": stats.likes_count if stats else 0}
 
 @app.get("/users/{user_id}/reputation")
-async def get_user_reputation(user_id: int, db: Session = Depends(get_db)):
-    from sqlalchemy import func
-    result = db.query(func.avg(Review.rating)).filter(Review.reviewee_id == user_id).scalar()
-    average_rating = float(result) if result else 0.0
-    review_count = db.query(Review).filter(Review.reviewee_id == user_id).count()
-    return {"average_rating": average_rating, "review_count": review_count}
+@response_cache.cached("seller:{user_id}")
+async def get_user_reputation(user_id: int, db: AsyncSession = Depends(get_async_db)):
+    stats = await db.get(SellerStats, user_id)
+    if not stats or not stats.review_count:
+        return {"average_rating": 0.0, "review_count": 0}
+    return {"average_rating": stats.rating_sum / stats.review_count, "review_count": stats.review_count}
 
 # Admin endpoints
+@app.get("/admin/metrics/password-hashing")
+async def get_password_hashing_metrics(current_user: Principal = Depends(get_current_user)):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return password_hasher.stats()
+
+@app.get("/admin/metrics/db-pool")
+async def get_db_pool_metrics(current_user: Principal = Depends(get_current_user)):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return pool_stats()
+
+@app.get("/admin/metrics/response-cache")
+async def get_response_cache_metrics(current_user: Principal = Depends(get_current_user)):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return response_cache.stats()
+
+@app.get("/admin/metrics/scheduler")
+async def get_scheduler_metrics(current_user: Principal = Depends(get_current_user)):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return scheduler.stats()
+
 @app.post("/admin/expire-featured")
-async def expire_featured_listings(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def expire_featured_listings(current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
     if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Admin access required")
-    now = datetime.utcnow()
-    expired_listings = db.query(Listing).filter(Listing.is_featured == True, Listing.featured_expires_at < now).all()
-    count = 0
-    for listing in expired_listings:
-        listing.is_featured = False
-        listing.featured_expires_at = None
-        count += 1
-    db.commit()
+    # The scheduler does this every FEATURED_EXPIRY_SECONDS; this runs it immediately
+    count = await expire_featured_job(db)
     return {"message": f"Expired {count} featured listings"}
 
 # Stripe placeholders for future integration
@@ -636,6 +1040,7 @@ async def feature_listing():
 async def verify_seller():
     # TODO: Implement seller verification with payment
     # This will set is_verified=True
+    # and must call apply_seller_verification(db, user_id, True) before setting it
     return {"message": "Seller verification not yet implemented"}
 
 if __name__ == "__main__":
@@ -0,0 +1,145 @@
+from contextvars import ContextVar
+from fastapi import Request, Response
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import event
+from starlette.routing import Match
+from typing import Callable, Dict, Optional
+from database import async_engine
+import os
+import time
+
+# Optional shared secret for /metrics; when set, scrapers must send "Authorization: Bearer <token>"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+registry = CollectorRegistry()
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests by route template and status",
+    ["method", "route", "status"], registry=registry,
+)
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template",
+    ["method", "route"], registry=registry,
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests currently being served", registry=registry)
+DB_QUERIES_PER_REQUEST = Histogram(
+    "http_request_db_queries", "Database statements executed per HTTP request",
+    ["method", "route"], registry=registry,
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100),
+)
+DB_TIME_PER_REQUEST = Histogram(
+    "http_request_db_seconds", "Time spent in database statements per HTTP request",
+    ["method", "route"], registry=registry,
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5),
+)
+DB_QUERY_LATENCY = Histogram(
+    "db_query_duration_seconds", "Latency of individual database statements (all callers)",
+    registry=registry,
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1, 5),
+)
+
+class QueryStats:
+    """Database statements issued while serving one request."""
+
+    __slots__ = ("count", "seconds")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+# Set per HTTP request by the middleware; None for WebSocket handlers and background tasks
+request_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("request_query_stats", default=None)
+
+@event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+@event.listens_for(async_engine.sync_engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    DB_QUERY_LATENCY.observe(elapsed)
+    stats = request_query_stats.get()
+    if stats is not None:
+        stats.count += 1
+        stats.seconds += elapsed
+
+class StatsCollector:
+    """
+    Exposes a component's existing `stats()` dict as gauges at scrape time.
+
+    Numbers become `<prefix>_<key>`; a dict of numbers becomes one gauge
+    labelled by its keys, and a dict of dicts one gauge per inner key.
+    The label name for a dict-valued entry comes from `labels`.
+    """
+
+    def __init__(self, prefix: str, func: Callable[[], dict], labels: Optional[Dict[str, str]] = None):
+        self.prefix = prefix
+        self.func = func
+        self.labels = labels or {}
+
+    def describe(self):
+        return []
+
+    def collect(self):
+        families = {}
+
+        def gauge(name: str, label: Optional[str] = None) -> GaugeMetricFamily:
+            if name not in families:
+                families[name] = GaugeMetricFamily(name, f"{self.prefix} stat", labels=[label] if label else None)
+            return families[name]
+
+        for key, value in self.func().items():
+            name = f"{self.prefix}_{key}"
+            if isinstance(value, (bool, int, float)):
+                gauge(name).add_metric([], float(value))
+            elif isinstance(value, dict):
+                label = self.labels.get(key, "key")
+                for item, inner in value.items():
+                    if isinstance(inner, (bool, int, float)):
+                        gauge(name, label).add_metric([str(item)], float(inner))
+                    elif isinstance(inner, dict):
+                        for inner_key, number in inner.items():
+                            if isinstance(number, (bool, int, float)):
+                                gauge(f"{name}_{inner_key}", label).add_metric([str(item)], float(number))
+        return list(families.values())
+
+def register_stats(prefix: str, func: Callable[[], dict], labels: Optional[Dict[str, str]] = None):
+    registry.register(StatsCollector(prefix, func, labels))
+
+def _route_template(request: Request) -> str:
+    route = request.scope.get("route")
+    if route is None:
+        # Responses served before routing (e.g. response cache hits)
+        for candidate in request.app.router.routes:
+            match, child_scope = candidate.matches(request.scope)
+            if match == Match.FULL:
+                route = candidate
+                break
+    # Unmatched paths share one label so scanners cannot blow up cardinality
+    return getattr(route, "path", "unmatched")
+
+async def middleware(request: Request, call_next):
+    stats = QueryStats()
+    request_query_stats.set(stats)
+    HTTP_IN_FLIGHT.inc()
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        elapsed = time.perf_counter() - started
+        HTTP_IN_FLIGHT.dec()
+        route = _route_template(request)
+        HTTP_REQUESTS.labels(request.method, route, str(status)).inc()
+        HTTP_LATENCY.labels(request.method, route).observe(elapsed)
+        DB_QUERIES_PER_REQUEST.labels(request.method, route).observe(stats.count)
+        DB_TIME_PER_REQUEST.labels(request.method, route).observe(stats.seconds)
+
+def metrics_response(request: Request) -> Response:
+    if METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+        return Response(status_code=401)
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, Float, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, DateTime, Text, Float, ForeignKey, Index, DDL, event, text, literal_column
 from sqlalchemy.orm import relationship
 from database import Base
 import datetime
@@ -57,6 +57,12 @@ class Review(Base):
     reviewer = relationship("User", foreign_keys=[reviewer_id], back_populates="reviews_given")
     reviewee = relationship("User", foreign_keys=[reviewee_id], back_populates="reviews_received")
 
+# Full-text document for listing search; its GIN index is created by migration 007, or by the
+# DDL after the Listing model for schemas built with create_all (Postgres only)
+LISTING_SEARCH_DOCUMENT = literal_column(
+    "to_tsvector('simple', coalesce(listings.description, '') || ' ' || listings.chronicle)"
+)
+
 class Listing(Base):
     __tablename__ = "listings"
 
@@ -69,15 +75,62 @@ class Listing(Base):
     price = Column(Float, nullable=False)
     description = Column(Text)
     status = Column(String, default="ACTIVE")  # ACTIVE or CLOSED
-    is_featured = Column(Boolean, default=False)
+    is_featured = Column(Boolean, default=False, nullable=False)
     featured_expires_at = Column(DateTime)
-    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
 
     seller = relationship("User", back_populates="listings")
     server = relationship("Server", back_populates="listings")
     reviews = relationship("Review", back_populates="listing")
     purchase_history = relationship("PurchaseHistory", back_populates="listing")
 
+    __table_args__ = (
+        # Keyset pagination for GET /listings (see migration 005)
+        Index(
+            "ix_listings_active_feed",
+            is_featured.desc(), created_at.desc(), id.desc(),
+            postgresql_where=text("status = 'ACTIVE'"),
+            sqlite_where=text("status = 'ACTIVE'"),
+        ),
+        # Search filters on active listings (see migration 006)
+        Index(
+            "ix_listings_active_server_feed",
+            server_id, is_featured.desc(), created_at.desc(), id.desc(),
+            postgresql_where=text("status = 'ACTIVE'"),
+            sqlite_where=text("status = 'ACTIVE'"),
+        ),
+        Index(
+            "ix_listings_active_server_type_price",
+            server_id, type, price,
+            postgresql_where=text("status = 'ACTIVE'"),
+            sqlite_where=text("status = 'ACTIVE'"),
+        ),
+        Index(
+            "ix_listings_active_seller_feed",
+            seller_id, is_featured.desc(), created_at.desc(), id.desc(),
+            postgresql_where=text("status = 'ACTIVE'"),
+            sqlite_where=text("status = 'ACTIVE'"),
+        ),
+        # Scheduled featured expiry (see migration 013)
+        Index(
+            "ix_listings_featured_expires_at",
+            featured_expires_at,
+            postgresql_where=text("is_featured"),
+            # SQLite compares booleans as integers, so the predicate must match "is_featured = 1"
+            sqlite_where=text("is_featured = 1"),
+        ),
+    )
+
+# Postgres-only search indexes (see migration 007), so create_all schemas match migrated ones
+event.listen(Listing.__table__, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"))
+for statement in (
+    "CREATE INDEX ix_listings_active_search_document ON listings "
+    "USING gin (to_tsvector('simple', coalesce(description, '') || ' ' || chronicle)) WHERE status = 'ACTIVE'",
+    "CREATE INDEX ix_listings_active_description_trgm ON listings USING gin (description gin_trgm_ops) WHERE status = 'ACTIVE'",
+    "CREATE INDEX ix_listings_active_chronicle_trgm ON listings USING gin (chronicle gin_trgm_ops) WHERE status = 'ACTIVE'",
+):
+    event.listen(Listing.__table__, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+
 class Message(Base):
     __tablename__ = "messages"
 
@@ -89,12 +142,17 @@ class Message(Base):
 
     sender = relationship("User", back_populates="messages")
 
+    __table_args__ = (
+        # History pagination and reconnect replay (see migration 011)
+        Index("ix_messages_room_id_id", room_id, id),
+    )
+
 class PurchaseHistory(Base):
     __tablename__ = "purchase_history"
 
     id = Column(Integer, primary_key=True, index=True)
     buyer_id = Column(Integer, ForeignKey("users.id"))
-    listing_id = Column(Integer, ForeignKey("listings.id"))
+    listing_id = Column(Integer, ForeignKey("listings.id"), index=True)
     transaction_date = Column(DateTime, default=datetime.datetime.utcnow)
     status = Column(String, nullable=False)  # e.g., COMPLETED, PENDING
 
@@ -110,4 +168,70 @@ class SellerLike(Base):
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
     buyer = relationship("User", foreign_keys=[buyer_id], back_populates="seller_likes_given")
-    seller = relationship("User", foreign_keys=[seller_id], back_populates="seller_likes_received")
\ No newline at end of file
+    seller = relationship("User", foreign_keys=[seller_id], back_populates="seller_likes_received")
+
+class ServerStats(Base):
+    __tablename__ = "server_stats"
+
+    # Maintained by stats.apply_listing_changes; reconciled periodically from listings/purchases
+    server_id = Column(Integer, ForeignKey("servers.id", ondelete="CASCADE"), primary_key=True)
+    active_listings = Column(Integer, nullable=False, default=0)
+    total_transactions = Column(Integer, nullable=False, default=0)
+    total_sellers = Column(Integer, nullable=False, default=0)
+    activity_score = Column(Integer, nullable=False, default=0, index=True)  # active_listings + total_transactions
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class ServerSellerStats(Base):
+    __tablename__ = "server_seller_stats"
+
+    # Counted listings per seller and server, so total_sellers can change by deltas
+    server_id = Column(Integer, ForeignKey("servers.id", ondelete="CASCADE"), primary_key=True)
+    seller_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    active_listings = Column(Integer, nullable=False, default=0)
+
+class SellerStats(Base):
+    __tablename__ = "seller_stats"
+
+    # Reputation counters maintained by stats.adjust_seller_stats alongside reviews/likes writes
+    seller_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    rating_sum = Column(Integer, nullable=False, default=0)
+    review_count = Column(Integer, nullable=False, default=0)
+    likes_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class ChatRoom(Base):
+    __tablename__ = "chat_rooms"
+
+    # One row per "<listing_id>_<buyer_id>_<seller_id>" room, maintained by chat.record_chat_message
+    room_id = Column(String, primary_key=True)
+    listing_id = Column(Integer, ForeignKey("listings.id", ondelete="SET NULL"))
+    buyer_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    seller_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    last_message_id = Column(Integer)
+    last_message_at = Column(DateTime)
+    buyer_unread = Column(Integer, nullable=False, default=0)
+    seller_unread = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("ix_chat_rooms_buyer_recent", buyer_id, last_message_at.desc()),
+        Index("ix_chat_rooms_seller_recent", seller_id, last_message_at.desc()),
+    )
+
+class PriceBucket(Base):
+    __tablename__ = "price_buckets"
+
+    # OHLC + volume per server/side/source and resolution, rolled up by pricehistory.record_price_events
+    server_id = Column(Integer, ForeignKey("servers.id", ondelete="CASCADE"), primary_key=True)
+    type = Column(String, primary_key=True)  # BUY or SELL
+    source = Column(String, primary_key=True)  # listing (asking prices) or trade (purchases)
+    resolution = Column(String, primary_key=True)  # 1m, 1h or 1d
+    bucket_start = Column(DateTime, primary_key=True)
+    open = Column(Float, nullable=False)
+    high = Column(Float, nullable=False)
+    low = Column(Float, nullable=False)
+    close = Column(Float, nullable=False)
+    volume = Column(BigInteger, nullable=False, default=0)
+    events = Column(Integer, nullable=False, default=0)
+    # Times of the events behind open and close, so late (back-dated) events cannot replace them
+    first_event_at = Column(DateTime, nullable=False)
+    last_event_at = Column(DateTime, nullable=False)
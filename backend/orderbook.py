@@ -0,0 +1,227 @@
+from bisect import bisect_left, insort
+from sqlalchemy import select, literal
+from typing import Dict, List, Optional, Tuple
+from database import AsyncSessionLocal
+from models import Listing
+import asyncio
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Each worker keeps its own book and shares its listing changes with the others through the
+# chat broker; the rebuild only repairs updates lost in transit (e.g. while a broker was down)
+ORDER_BOOK_REBUILD_SECONDS = float(os.getenv("ORDER_BOOK_REBUILD_SECONDS", "3600"))
+
+# Internal broker channel (not a chat room) carrying order book changes, and most changes per
+# message; messages the broker cannot carry (NOTIFY's 8000 bytes) are split further
+ORDER_BOOK_CHANNEL = "order_book"
+ORDER_BOOK_PUBLISH_BATCH = 100
+
+# SELL listings are asks, BUY listings are bids
+SIDES = {"SELL": "asks", "BUY": "bids"}
+
+class PriceLevels:
+    """Summed quantity and listing count per price, with the prices kept sorted."""
+
+    def __init__(self):
+        self.prices: List[float] = []
+        self.levels: Dict[float, List[int]] = {}
+
+    def add(self, price: float, quantity: int):
+        level = self.levels.get(price)
+        if level is None:
+            self.levels[price] = [quantity, 1]
+            insort(self.prices, price)
+        else:
+            level[0] += quantity
+            level[1] += 1
+
+    def remove(self, price: float, quantity: int):
+        level = self.levels[price]
+        level[0] -= quantity
+        level[1] -= 1
+        if level[1] == 0:
+            del self.levels[price]
+            del self.prices[bisect_left(self.prices, price)]
+
+    def depth(self, limit: int, descending: bool) -> List[dict]:
+        prices = self.prices[::-1][:limit] if descending else self.prices[:limit]
+        return [{"price": p, "quantity": self.levels[p][0], "listings": self.levels[p][1]} for p in prices]
+
+def _parse_entry(entry) -> Optional[tuple]:
+    # Same shape as OrderBook.entries values; raises ValueError/TypeError on anything else
+    if entry is None:
+        return None
+    server_id, type, price, quantity = entry
+    if type not in SIDES or isinstance(server_id, bool) or not isinstance(server_id, int) or not isinstance(quantity, int):
+        raise ValueError(f"invalid order book entry {entry!r}")
+    return server_id, type, float(price), quantity
+
+class OrderBook:
+    """
+    Aggregated ACTIVE listings per (server_id, type), kept in memory.
+
+    Rebuilt from the listings table at startup (and on a long interval), and
+    updated in place by the handlers that create, change or delete listings.
+    With a broker (the chat broker, shared), those updates are also published
+    to the other workers, which apply them to their own books.
+    """
+
+    def __init__(self, broker=None):
+        self.books: Dict[Tuple[int, str], PriceLevels] = {}
+        # listing id -> (server_id, type, price, quantity) of the entry currently in the book
+        self.entries: Dict[int, Tuple[int, str, float, int]] = {}
+        # Updates applied while a rebuild is loading, replayed onto the fresh snapshot
+        self._pending: Optional[List[Tuple[int, Optional[tuple]]]] = None
+        self.rebuilds = 0
+        self.broker = broker
+        self.published = 0
+        self.received = 0
+        self._outbox: List[Tuple[int, Optional[tuple]]] = []
+        self._wakeup = asyncio.Event()
+        self._publisher = None
+
+    async def start(self):
+        if self.broker is None:
+            return
+        # The broker is started and stopped by its owner (the chat connection manager)
+        await self.broker.listen(ORDER_BOOK_CHANNEL, self._receive)
+        self._publisher = asyncio.create_task(self._publish())
+
+    async def stop(self):
+        if self._publisher:
+            self._publisher.cancel()
+            await asyncio.gather(self._publisher, return_exceptions=True)
+            self._publisher = None
+            await self._send()
+
+    def _set(self, listing_id: int, entry: Optional[tuple]):
+        previous = self.entries.pop(listing_id, None)
+        if previous is not None:
+            server_id, type, price, quantity = previous
+            levels = self.books[(server_id, type)]
+            levels.remove(price, quantity)
+            if not levels.prices:
+                del self.books[(server_id, type)]
+        if entry is not None:
+            server_id, type, price, quantity = entry
+            self.books.setdefault((server_id, type), PriceLevels()).add(price, quantity)
+            self.entries[listing_id] = entry
+
+    def apply(self, listing: Listing):
+        """Record a listing's current state (call after the change is committed)."""
+        entry = None
+        if listing.status == "ACTIVE" and listing.server_id is not None and listing.type in SIDES:
+            entry = (listing.server_id, listing.type, float(listing.price), listing.quantity)
+        self._update(listing.id, entry)
+
+    def remove(self, listing_id: int):
+        self._update(listing_id, None)
+
+    def _update(self, listing_id: int, entry: Optional[tuple], publish: bool = True):
+        self._set(listing_id, entry)
+        if self._pending is not None:
+            self._pending.append((listing_id, entry))
+        if publish and self._publisher is not None:
+            self._outbox.append((listing_id, entry))
+            self._wakeup.set()
+
+    async def _publish(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            await self._send()
+
+    async def _send(self):
+        changes, self._outbox = self._outbox, []
+        for start in range(0, len(changes), ORDER_BOOK_PUBLISH_BATCH):
+            await self._send_chunk(changes[start:start + ORDER_BOOK_PUBLISH_BATCH])
+
+    async def _send_chunk(self, chunk: list):
+        message = json.dumps({"changes": chunk})
+        if not self.broker.fits(message):
+            if len(chunk) == 1:
+                logger.warning("Order book change for listing %s too large to publish", chunk[0][0])
+                return
+            half = len(chunk) // 2
+            await self._send_chunk(chunk[:half])
+            await self._send_chunk(chunk[half:])
+            return
+        try:
+            await self.broker.notify(ORDER_BOOK_CHANNEL, message)
+            self.published += len(chunk)
+        except Exception:
+            # Other workers catch up on their next rebuild
+            logger.exception("Failed to publish %d order book changes", len(chunk))
+
+    async def _receive(self, message: str):
+        try:
+            changes = [(int(listing_id), _parse_entry(entry)) for listing_id, entry in json.loads(message)["changes"]]
+        except (ValueError, TypeError, KeyError, IndexError):
+            logger.warning("Ignoring malformed order book update")
+            return
+        for listing_id, entry in changes:
+            self._update(listing_id, entry, publish=False)
+        self.received += len(changes)
+
+    def remove_server(self, server_id: int):
+        for listing_id in [i for i, entry in self.entries.items() if entry[0] == server_id]:
+            self.remove(listing_id)
+
+    async def rebuild(self):
+        self._pending = []
+        try:
+            fresh = OrderBook()
+            async with AsyncSessionLocal() as db:
+                result = await db.stream(
+                    select(Listing.id, Listing.server_id, Listing.type, Listing.price, Listing.quantity)
+                    .where(Listing.status == literal("ACTIVE", literal_execute=True))
+                    .where(Listing.server_id.is_not(None))
+                    .execution_options(yield_per=5000)
+                )
+                async for listing_id, server_id, type, price, quantity in result:
+                    if type in SIDES:
+                        fresh._set(listing_id, (server_id, type, float(price), quantity))
+            for listing_id, entry in self._pending:
+                fresh._set(listing_id, entry)
+            self.books, self.entries = fresh.books, fresh.entries
+            self.rebuilds += 1
+        finally:
+            self._pending = None
+
+    def snapshot(self, server_id: int, type: Optional[str] = None, depth: int = 20) -> dict:
+        asks = self.books.get((server_id, "SELL"))
+        bids = self.books.get((server_id, "BUY"))
+        best_ask = asks.prices[0] if asks else None
+        best_bid = bids.prices[-1] if bids else None
+        book = {
+            "server_id": server_id,
+            "best_bid": best_bid,
+            "best_ask": best_ask,
+            "spread": best_ask - best_bid if best_ask is not None and best_bid is not None else None,
+        }
+        if type in (None, "SELL"):
+            book["asks"] = asks.depth(depth, descending=False) if asks else []
+        if type in (None, "BUY"):
+            book["bids"] = bids.depth(depth, descending=True) if bids else []
+        return book
+
+    def stats(self) -> dict:
+        return {
+            "books": len(self.books),
+            "listings": len(self.entries),
+            "rebuilds": self.rebuilds,
+            "published": self.published,
+            "received": self.received,
+        }
+
+async def run_order_book_refresher(book: OrderBook, interval: float = ORDER_BOOK_REBUILD_SECONDS):
+    # The first rebuild happens at startup, so wait before refreshing
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await book.rebuild()
+        except Exception:
+            logger.exception("Order book rebuild failed")
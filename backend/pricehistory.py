@@ -0,0 +1,119 @@
+from sqlalchemy import case, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from operator import itemgetter
+from typing import Iterable, NamedTuple, Optional
+from database import dialect_insert
+from models import Listing, PriceBucket
+import datetime
+
+# Bucket widths, all maintained for every event
+RESOLUTIONS = {
+    "1m": lambda at: at.replace(second=0, microsecond=0),
+    "1h": lambda at: at.replace(minute=0, second=0, microsecond=0),
+    "1d": lambda at: at.replace(hour=0, minute=0, second=0, microsecond=0),
+}
+RESOLUTION_WIDTHS = {
+    "1m": datetime.timedelta(minutes=1),
+    "1h": datetime.timedelta(hours=1),
+    "1d": datetime.timedelta(days=1),
+}
+SOURCES = ("listing", "trade")
+
+class PriceEvent(NamedTuple):
+    server_id: int
+    type: str
+    source: str
+    price: float
+    quantity: int
+    at: datetime.datetime
+
+def listing_event(listing: Listing, source: str = "listing", at: Optional[datetime.datetime] = None) -> Optional[PriceEvent]:
+    """The price event for a listing being posted/repriced, or traded when source="trade"."""
+    if listing is None or listing.server_id is None or listing.type not in ("BUY", "SELL"):
+        return None
+    return PriceEvent(listing.server_id, listing.type, source, float(listing.price), listing.quantity, at or datetime.datetime.utcnow())
+
+def fold_price_events(events: Iterable[Optional[PriceEvent]]) -> dict:
+    """Roll events into their 1m/1h/1d buckets: {primary key: [open, high, low, close, volume, events, first_event_at, last_event_at]}."""
+    buckets = {}
+    # Events are folded in time order, so consecutive events mostly fall in the bucket
+    # window of the previous one and skip the truncation: [resolution, truncate, width, start, end]
+    windows = [[resolution, truncate, RESOLUTION_WIDTHS[resolution], None, None] for resolution, truncate in RESOLUTIONS.items()]
+    for server_id, type, source, price, quantity, at in sorted((e for e in events if e is not None), key=itemgetter(5)):
+        for window in windows:
+            start = window[3]
+            if start is None or not start <= at < window[4]:
+                start = window[3] = window[1](at)
+                window[4] = start + window[2]
+            key = (server_id, type, source, window[0], start)
+            bucket = buckets.get(key)
+            if bucket is None:
+                buckets[key] = [price, price, price, price, quantity, 1, at, at]
+            else:
+                if price > bucket[1]:
+                    bucket[1] = price
+                elif price < bucket[2]:
+                    bucket[2] = price
+                bucket[3] = price
+                bucket[4] += quantity
+                bucket[5] += 1
+                bucket[7] = at
+    return buckets
+
+async def record_price_events(db: AsyncSession, events: Iterable[Optional[PriceEvent]]):
+    """Roll events into their 1m/1h/1d buckets inside the caller's transaction."""
+    rows = [
+        {
+            "server_id": key[0], "type": key[1], "source": key[2], "resolution": key[3], "bucket_start": key[4],
+            "open": bucket[0], "high": bucket[1], "low": bucket[2], "close": bucket[3], "volume": bucket[4], "events": bucket[5],
+            "first_event_at": bucket[6], "last_event_at": bucket[7],
+        }
+        for key, bucket in fold_price_events(events).items()
+    ]
+    if not rows:
+        return
+    # One multi-row upsert; rows were folded above so no bucket appears twice in the statement
+    statement = dialect_insert(db)(PriceBucket).values(rows)
+    excluded = statement.excluded
+    # Events can arrive out of time order (back-dated purchases, concurrent transactions):
+    # open and close only move to events earlier/later than the ones they already hold
+    earlier = excluded.first_event_at < PriceBucket.first_event_at
+    later = excluded.last_event_at >= PriceBucket.last_event_at
+    statement = statement.on_conflict_do_update(
+        index_elements=[PriceBucket.server_id, PriceBucket.type, PriceBucket.source, PriceBucket.resolution, PriceBucket.bucket_start],
+        set_={
+            "open": case((earlier, excluded.open), else_=PriceBucket.open),
+            "high": case((excluded.high > PriceBucket.high, excluded.high), else_=PriceBucket.high),
+            "low": case((excluded.low < PriceBucket.low, excluded.low), else_=PriceBucket.low),
+            "close": case((later, excluded.close), else_=PriceBucket.close),
+            "volume": PriceBucket.volume + excluded.volume,
+            "events": PriceBucket.events + excluded.events,
+            "first_event_at": case((earlier, excluded.first_event_at), else_=PriceBucket.first_event_at),
+            "last_event_at": case((later, excluded.last_event_at), else_=PriceBucket.last_event_at),
+        },
+    )
+    await db.execute(statement)
+
+async def price_history(
+    db: AsyncSession,
+    server_id: int,
+    type: str,
+    source: str,
+    resolution: str,
+    start: Optional[datetime.datetime] = None,
+    end: Optional[datetime.datetime] = None,
+    limit: int = 200,
+) -> list:
+    """The latest `limit` buckets in [start, end), oldest first; a primary key range scan."""
+    query = select(PriceBucket).where(
+        PriceBucket.server_id == server_id,
+        PriceBucket.type == type,
+        PriceBucket.source == source,
+        PriceBucket.resolution == resolution,
+    )
+    if start is not None:
+        query = query.where(PriceBucket.bucket_start >= start)
+    if end is not None:
+        query = query.where(PriceBucket.bucket_start < end)
+    result = await db.execute(query.order_by(PriceBucket.bucket_start.desc()).limit(limit))
+    return list(reversed(result.scalars().all()))
@@ -0,0 +1,127 @@
+from collections import Counter, deque
+from contextvars import ContextVar
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from typing import Callable, Dict, List, Optional
+import logging
+import os
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+# Opt-in: development and staging only, it keeps every statement of a request in memory
+QUERY_INSPECTOR = os.getenv("QUERY_INSPECTOR", "false").lower() in ("1", "true", "yes")
+QUERY_SLOW_MS = float(os.getenv("QUERY_SLOW_MS", "100"))
+# Same statement shape this many times in one request is reported as a likely N+1
+QUERY_REPEAT_THRESHOLD = int(os.getenv("QUERY_REPEAT_THRESHOLD", "5"))
+# Default statements allowed per request; routes can override it with @query_inspector.budget(n)
+QUERY_BUDGET = int(os.getenv("QUERY_BUDGET", "20"))
+# Strict mode answers over-budget requests with a 500 so test runs fail loudly
+QUERY_BUDGET_STRICT = os.getenv("QUERY_BUDGET_STRICT", "false").lower() in ("1", "true", "yes")
+
+_NORMALIZE = [
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    (re.compile(r"\$\d+|%\(\w+\)s|:\w+|\?"), "?"),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),
+    # Expanded IN lists and multi-row VALUES differ only in length
+    (re.compile(r"\?(?:\s*,\s*\?)+"), "?"),
+    (re.compile(r"\(\?\)(?:\s*,\s*\(\?\))+"), "(?)"),
+    (re.compile(r"\s+"), " "),
+]
+
+def statement_shape(statement: str) -> str:
+    """The statement with literals and placeholders folded, so loops over ids collapse to one shape."""
+    for pattern, replacement in _NORMALIZE:
+        statement = pattern.sub(replacement, statement)
+    return statement.strip()
+
+class RequestQueries:
+    __slots__ = ("statements", "seconds")
+
+    def __init__(self):
+        self.statements: List[str] = []
+        self.seconds = 0.0
+
+_current: ContextVar[Optional[RequestQueries]] = ContextVar("query_inspector_request", default=None)
+
+class QueryInspector:
+    """
+    Flags slow statements, repeated statement shapes (N+1 loops) and requests over a query budget.
+
+    Disabled unless QUERY_INSPECTOR is set; `install(engine)` and the
+    middleware are then no-ops, while `budget(n)` still records overrides.
+    """
+
+    def __init__(self, enabled: bool = QUERY_INSPECTOR, slow_ms: float = QUERY_SLOW_MS,
+                 repeat_threshold: int = QUERY_REPEAT_THRESHOLD, default_budget: int = QUERY_BUDGET,
+                 strict: bool = QUERY_BUDGET_STRICT):
+        self.enabled = enabled
+        self.slow_seconds = slow_ms / 1000
+        self.repeat_threshold = repeat_threshold
+        self.default_budget = default_budget
+        self.strict = strict
+        self.budgets: Dict[Callable, int] = {}
+        # Most recent violations, for test harnesses to assert on after a run
+        self.violations: deque = deque(maxlen=1000)
+
+    def budget(self, queries: int):
+        def register(endpoint: Callable) -> Callable:
+            self.budgets[endpoint] = queries
+            return endpoint
+        return register
+
+    def install(self, engine):
+        if not self.enabled:
+            return
+        from sqlalchemy import event
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("inspector_started", []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["inspector_started"].pop()
+        if elapsed >= self.slow_seconds:
+            logger.warning("Slow query (%.1f ms): %s", elapsed * 1000, " ".join(statement.split())[:500])
+        queries = _current.get()
+        if queries is not None:
+            queries.statements.append(statement)
+            queries.seconds += elapsed
+
+    def _violation(self, kind: str, request: Request, route: str, **details) -> dict:
+        violation = {"kind": kind, "method": request.method, "route": route, **details}
+        self.violations.append(violation)
+        return violation
+
+    async def middleware(self, request: Request, call_next):
+        if not self.enabled:
+            return await call_next(request)
+        queries = RequestQueries()
+        _current.set(queries)
+        response = await call_next(request)
+
+        route = request.scope.get("route")
+        route_path = getattr(route, "path", request.url.path)
+        repeated = [
+            (shape, count) for shape, count in Counter(statement_shape(s) for s in queries.statements).most_common()
+            if count >= self.repeat_threshold
+        ]
+        for shape, count in repeated:
+            logger.warning("Possible N+1 on %s %s: %d x %s", request.method, route_path, count, shape[:300])
+            self._violation("repeated_statement", request, route_path, count=count, statement=shape)
+
+        budget = self.budgets.get(getattr(route, "endpoint", None), self.default_budget)
+        count = len(queries.statements)
+        if count > budget:
+            logger.warning("Query budget exceeded on %s %s: %d > %d", request.method, route_path, count, budget)
+            violation = self._violation("budget_exceeded", request, route_path, count=count, budget=budget)
+            if self.strict:
+                return JSONResponse(status_code=500, content={"detail": "Query budget exceeded", **violation})
+
+        response.headers["X-Query-Count"] = str(count)
+        response.headers["X-Query-Time-Ms"] = f"{queries.seconds * 1000:.1f}"
+        return response
+
+query_inspector = QueryInspector()
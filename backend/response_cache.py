@@ -0,0 +1,194 @@
+from fastapi import Request, Response
+from starlette.routing import Match
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from cache import TTLCache
+import hashlib
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Cached GET responses for anonymous read endpoints
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "30"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "2048"))
+# Optional shared backend (redis://...) so every worker sees the same entries and invalidations
+RESPONSE_CACHE_URL = os.getenv("RESPONSE_CACHE_URL")
+
+# Response headers stored with the body and replayed on a hit
+CACHED_HEADERS = ("content-type", "x-next-cursor")
+
+def etag_matches(etag: str, if_none_match: str) -> bool:
+    # If-None-Match is "*" or a comma-separated list of (possibly weak) tags, compared weakly
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or (tag[2:] if tag.startswith("W/") else tag) == etag:
+            return True
+    return False
+
+class LocalBackend:
+    """Entries and tag versions held in this process only."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.entries = TTLCache(maxsize, ttl)
+        self.versions: Dict[str, int] = {}
+
+    async def get_versions(self, tags: List[str]) -> List[int]:
+        return [self.versions.get(tag, 0) for tag in tags]
+
+    async def bump(self, tags: Iterable[str]):
+        for tag in tags:
+            self.versions[tag] = self.versions.get(tag, 0) + 1
+
+    async def get(self, key: str) -> Optional[dict]:
+        return self.entries.get(key)
+
+    async def set(self, key: str, entry: dict, ttl: float):
+        self.entries.set(key, entry, ttl)
+
+    async def close(self):
+        pass
+
+class RedisBackend:
+    """Entries and tag versions shared by every worker through Redis."""
+
+    VERSIONS_KEY = "response-cache:versions"
+
+    def __init__(self, url: str, client=None):
+        if client is None:
+            try:
+                import redis.asyncio as redis
+            except ImportError:
+                raise RuntimeError("RESPONSE_CACHE_URL requires the 'redis' package")
+            client = redis.from_url(url)
+        self.client = client
+
+    async def get_versions(self, tags: List[str]) -> List[int]:
+        values = await self.client.hmget(self.VERSIONS_KEY, tags)
+        return [int(value) if value is not None else 0 for value in values]
+
+    async def bump(self, tags: Iterable[str]):
+        pipe = self.client.pipeline()
+        for tag in tags:
+            pipe.hincrby(self.VERSIONS_KEY, tag, 1)
+        await pipe.execute()
+
+    async def get(self, key: str) -> Optional[dict]:
+        raw = await self.client.get("response-cache:" + key)
+        if raw is None:
+            return None
+        entry = json.loads(raw)
+        entry["body"] = entry["body"].encode("latin-1")
+        return entry
+
+    async def set(self, key: str, entry: dict, ttl: float):
+        raw = json.dumps({**entry, "body": entry["body"].decode("latin-1")})
+        await self.client.set("response-cache:" + key, raw, px=int(ttl * 1000))
+
+    async def close(self):
+        await self.client.aclose()
+
+class ResponseCache:
+    """
+    Whole-response cache for anonymous GET endpoints, keyed on path + query.
+
+    Routes opt in with the `cached(*tags)` decorator. Tags may reference path
+    parameters ("seller:{user_id}"). Entries are never deleted on writes:
+    `invalidate(*tags)` bumps the tags' versions, which are part of every
+    entry's key, so stale entries simply stop being reachable and age out.
+    """
+
+    def __init__(self, backend=None, ttl: float = RESPONSE_CACHE_TTL):
+        self.backend = backend or LocalBackend(RESPONSE_CACHE_SIZE, ttl)
+        self.ttl = ttl
+        self.routes: Dict[Callable, Tuple[str, ...]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.errors = 0
+
+    def cached(self, *tags: str):
+        def register(endpoint: Callable) -> Callable:
+            self.routes[endpoint] = tags
+            return endpoint
+        return register
+
+    async def invalidate(self, *tags: str):
+        try:
+            await self.backend.bump(tags)
+        except Exception:
+            # Entries still expire after `ttl`
+            self.errors += 1
+            logger.exception("Response cache invalidation failed for %s", tags)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "not_modified": self.not_modified,
+            "errors": self.errors,
+        }
+
+    def _route_tags(self, request: Request) -> Optional[List[str]]:
+        for route in request.app.router.routes:
+            match, child_scope = route.matches(request.scope)
+            if match == Match.FULL:
+                tags = self.routes.get(child_scope.get("endpoint"))
+                if tags is None:
+                    return None
+                params = child_scope.get("path_params", {})
+                return [tag.format(**params) for tag in tags]
+        return None
+
+    def _respond(self, request: Request, entry: dict) -> Response:
+        headers = {**entry["headers"], "ETag": entry["etag"], "Cache-Control": "no-cache"}
+        if etag_matches(entry["etag"], request.headers.get("if-none-match", "")):
+            self.not_modified += 1
+            return Response(status_code=304, headers={"ETag": entry["etag"], "Cache-Control": "no-cache"})
+        return Response(content=entry["body"], status_code=200, headers=headers)
+
+    async def middleware(self, request: Request, call_next):
+        if request.method != "GET":
+            return await call_next(request)
+        tags = self._route_tags(request)
+        if tags is None:
+            return await call_next(request)
+
+        query = "&".join(sorted(request.url.query.split("&"))) if request.url.query else ""
+        try:
+            versions = await self.backend.get_versions(tags)
+            key = f"{request.url.path}?{query}#" + ",".join(f"{t}={v}" for t, v in zip(tags, versions))
+            entry = await self.backend.get(key)
+        except Exception:
+            self.errors += 1
+            logger.exception("Response cache lookup failed")
+            return await call_next(request)
+        if entry is not None:
+            self.hits += 1
+            return self._respond(request, entry)
+
+        self.misses += 1
+        response = await call_next(request)
+        if response.status_code != 200:
+            return response
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        entry = {
+            "body": body,
+            "etag": '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"',
+            "headers": {name: response.headers[name] for name in CACHED_HEADERS if name in response.headers},
+        }
+        try:
+            await self.backend.set(key, entry, self.ttl)
+        except Exception:
+            self.errors += 1
+            logger.exception("Response cache store failed")
+        return self._respond(request, entry)
+
+    async def close(self):
+        await self.backend.close()
+
+def create_response_cache(url: Optional[str] = RESPONSE_CACHE_URL) -> ResponseCache:
+    return ResponseCache(RedisBackend(url) if url else None)
@@ -0,0 +1,150 @@
+from sqlalchemy import text, update
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+from typing import Awaitable, Callable, List, Optional
+from database import async_engine, AsyncSessionLocal
+from models import Listing
+import asyncio
+import datetime
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Replicas compete for this Postgres advisory lock; the holder runs the scheduled jobs
+SCHEDULER_LOCK_KEY = int(os.getenv("SCHEDULER_LOCK_KEY", "720145"))
+# How often followers retry the lock and the leader checks its lock connection (seconds)
+SCHEDULER_POLL_SECONDS = float(os.getenv("SCHEDULER_POLL_SECONDS", "5"))
+FEATURED_EXPIRY_SECONDS = float(os.getenv("FEATURED_EXPIRY_SECONDS", "30"))
+
+def featured_expiry_statement(now: Optional[datetime.datetime] = None):
+    # Served by ix_listings_featured_expires_at (partial on is_featured)
+    return update(Listing)\
+        .where(Listing.is_featured == True, Listing.featured_expires_at < (now or datetime.datetime.utcnow()))\
+        .values(is_featured=False, featured_expires_at=None)\
+        .execution_options(synchronize_session=False)
+
+async def expire_featured(db: AsyncSession, now: Optional[datetime.datetime] = None) -> int:
+    """Un-feature every listing whose featured period is over, in one set-based UPDATE."""
+    result = await db.execute(featured_expiry_statement(now))
+    return result.rowcount
+
+class Job:
+    def __init__(self, name: str, interval: float, func: Callable[[AsyncSession], Awaitable[Optional[int]]]):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.next_run = 0.0
+        self.runs = 0
+        self.failures = 0
+        self.affected_total = 0
+        self.last_affected: Optional[int] = None
+        self.last_duration_seconds: Optional[float] = None
+        self.last_run_at: Optional[datetime.datetime] = None
+
+    def stats(self) -> dict:
+        return {
+            "interval_seconds": self.interval,
+            "runs": self.runs,
+            "failures": self.failures,
+            "affected_total": self.affected_total,
+            "last_affected": self.last_affected,
+            "last_duration_seconds": self.last_duration_seconds,
+            "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+        }
+
+class Scheduler:
+    """
+    Periodic maintenance jobs that must run on exactly one replica.
+
+    On Postgres the replica holding a session-level advisory lock is the
+    leader; the lock lives on a dedicated autocommit connection and is
+    released if that connection drops, letting another replica take over.
+    Other databases are treated as single-node, so the process always leads.
+    """
+
+    def __init__(self, lock_key: int = SCHEDULER_LOCK_KEY, poll_interval: float = SCHEDULER_POLL_SECONDS):
+        self.lock_key = lock_key
+        self.poll_interval = poll_interval
+        self.jobs: List[Job] = []
+        self.is_leader = False
+        self.leader_since: Optional[datetime.datetime] = None
+        self._lock_connection: Optional[AsyncConnection] = None
+
+    def add_job(self, name: str, interval: float, func: Callable[[AsyncSession], Awaitable[Optional[int]]]):
+        """Register `func(db)`; it commits its own work and may return a count of affected rows."""
+        self.jobs.append(Job(name, interval, func))
+
+    async def _hold_leadership(self) -> bool:
+        if async_engine.dialect.name != "postgresql":
+            return True
+        try:
+            if self._lock_connection is not None:
+                await self._lock_connection.execute(text("SELECT 1"))
+                return True
+            connection = await async_engine.connect()
+            connection = await connection.execution_options(isolation_level="AUTOCOMMIT")
+            acquired = await connection.scalar(text("SELECT pg_try_advisory_lock(:key)"), {"key": self.lock_key})
+            if acquired:
+                self._lock_connection = connection
+                return True
+            await connection.close()
+        except Exception:
+            logger.exception("Scheduler leader check failed")
+            await self._release()
+        return False
+
+    async def _release(self):
+        connection, self._lock_connection = self._lock_connection, None
+        if connection is None:
+            return
+        try:
+            await connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": self.lock_key})
+        except Exception:
+            pass
+        try:
+            await connection.close()
+        except Exception:
+            pass
+
+    async def _run_job(self, job: Job):
+        started = time.perf_counter()
+        job.last_run_at = datetime.datetime.utcnow()
+        try:
+            async with AsyncSessionLocal() as db:
+                affected = await job.func(db)
+            job.runs += 1
+            job.last_affected = affected
+            job.affected_total += affected or 0
+        except Exception:
+            job.failures += 1
+            logger.exception("Scheduled job %s failed", job.name)
+        job.last_duration_seconds = time.perf_counter() - started
+
+    async def run(self):
+        try:
+            while True:
+                leader = await self._hold_leadership()
+                if leader != self.is_leader:
+                    logger.info("Scheduler %s leadership", "acquired" if leader else "lost")
+                    self.is_leader = leader
+                    self.leader_since = datetime.datetime.utcnow() if leader else None
+                if leader:
+                    for job in self.jobs:
+                        if job.next_run <= time.monotonic():
+                            job.next_run = time.monotonic() + job.interval
+                            await self._run_job(job)
+                    next_due = min((job.next_run for job in self.jobs), default=time.monotonic() + self.poll_interval)
+                    await asyncio.sleep(max(0.0, min(self.poll_interval, next_due - time.monotonic())))
+                else:
+                    await asyncio.sleep(self.poll_interval)
+        finally:
+            self.is_leader = False
+            await self._release()
+
+    def stats(self) -> dict:
+        return {
+            "is_leader": self.is_leader,
+            "leader_since": self.leader_since.isoformat() if self.leader_since else None,
+            "jobs": {job.name: job.stats() for job in self.jobs},
+        }
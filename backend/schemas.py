@@ -32,6 +32,31 @@ class ServerActivityResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class OrderBookLevel(BaseModel):
+    price: float
+    quantity: int
+    listings: int
+
+class OrderBookResponse(BaseModel):
+    server_id: int
+    best_bid: Optional[float] = None
+    best_ask: Optional[float] = None
+    spread: Optional[float] = None
+    bids: Optional[List[OrderBookLevel]] = None
+    asks: Optional[List[OrderBookLevel]] = None
+
+class PriceBucketResponse(BaseModel):
+    bucket_start: datetime
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: int
+    events: int
+
+    class Config:
+        from_attributes = True
+
 # User schemas
 class UserBase(BaseModel):
     email: EmailStr
@@ -56,6 +81,12 @@ class UserResponse(UserBase):
 class UserLanguageUpdate(BaseModel):
     language: str
 
+class SellerReputationResponse(BaseModel):
+    user_id: int
+    average_rating: float
+    review_count: int
+    likes_count: int
+
 # Token schemas
 class Token(BaseModel):
     access_token: str
@@ -138,6 +169,21 @@ class ListingResponse(ListingBase):
     class Config:
         from_attributes = True
 
+class ListingBulkCreate(BaseModel):
+    items: List[ListingCreate]
+
+class ListingBulkUpdateItem(ListingUpdate):
+    id: int
+
+class ListingBulkUpdate(BaseModel):
+    items: List[ListingBulkUpdateItem]
+
+class ListingBulkResult(BaseModel):
+    index: int
+    status: str  # created, updated, not_found, forbidden or invalid
+    listing: Optional[ListingResponse] = None
+    detail: Optional[str] = None
+
 # Message schemas
 class MessageBase(BaseModel):
     room_id: str
@@ -0,0 +1,329 @@
+"""
+Synthetic marketplace data for local development and load testing.
+
+Volumes scale linearly with --scale (1.0 is about a million listings and a
+million chat messages) and follow the skew seen in production: a few hot
+servers carry most listings, 2% of users are power sellers, and chat traffic
+concentrates in a small number of busy rooms. Rows are generated with a fixed
+RNG seed and bulk loaded with COPY on Postgres (asyncpg) or batched multi-row
+inserts elsewhere; derived tables (chat rooms, price buckets, seller and
+server stats) are computed from the same data.
+
+    cd backend && python seed.py --scale 0.01
+    cd backend && DATABASE_URL=postgresql://... python seed.py --scale 1 --reset
+
+Every user is user<N>@example.com with the same password (--password).
+"""
+import argparse
+import asyncio
+import datetime
+import random
+import sys
+import time
+from typing import Iterable, List, Sequence
+
+from sqlalchemy import Table, select, text
+from auth import get_password_hash
+from chat import fold_chat_rooms
+from database import AsyncSessionLocal, async_engine, Base
+from models import User, Server, Profile, Listing, Review, Message, PurchaseHistory, SellerLike, SellerStats, ChatRoom, PriceBucket
+from pricehistory import fold_price_events
+from stats import reconcile_server_stats
+
+# Row counts at --scale 1.0
+SCALE_1 = {
+    "users": 100_000,
+    "servers": 100,
+    "listings": 1_000_000,
+    "purchases": 250_000,
+    "reviews": 150_000,
+    "likes": 150_000,
+    "rooms": 50_000,
+    "messages": 1_000_000,
+}
+# Fraction of users that are power sellers, and their weight against an ordinary user
+POWER_SELLER_SHARE = 0.02
+POWER_SELLER_WEIGHT = 50
+CHRONICLES = ["Interlude", "High Five", "Classic", "Essence", "Gracia Final"]
+DESCRIPTIONS = [
+    "fast delivery adena", "safe trade, face to face", "bulk adena stock", "cheap adena, online now",
+    "buying adena, paying instantly", "trusted seller, instant delivery", "adena for items or cash",
+    "weekend discount on adena", "clan stock, large quantities", "small orders welcome",
+]
+RATINGS = [1, 2, 3, 4, 5]
+RATING_WEIGHTS = [2, 3, 10, 30, 55]
+COPY_BATCH = 50_000
+INSERT_BATCH = 5_000
+
+def scaled_counts(scale: float) -> dict:
+    counts = {name: max(1, int(count * scale)) for name, count in SCALE_1.items()}
+    counts["servers"] = max(3, counts["servers"])
+    counts["users"] = max(10, counts["users"])
+    return counts
+
+def zipf_cum_weights(n: int, exponent: float = 1.0) -> List[float]:
+    """Cumulative Zipf weights: item 0 is the most popular."""
+    total, weights = 0.0, []
+    for rank in range(1, n + 1):
+        total += 1.0 / rank ** exponent
+        weights.append(total)
+    return weights
+
+def ascending_times(rng: random.Random, n: int, start: datetime.datetime, end: datetime.datetime) -> List[datetime.datetime]:
+    """n timestamps spread over [start, end) in ascending order, so id order matches time order."""
+    step = (end - start).total_seconds() / n
+    return [start + datetime.timedelta(seconds=(i + rng.random()) * step) for i in range(n)]
+
+async def load_rows(db, table: Table, columns: Sequence[str], rows: Iterable[tuple]) -> int:
+    """Bulk load tuples into `table`: COPY on asyncpg, multi-row INSERT batches elsewhere."""
+    connection = await db.connection()
+    if async_engine.dialect.driver == "asyncpg":
+        raw = (await connection.get_raw_connection()).driver_connection
+
+        async def flush(batch):
+            await raw.copy_records_to_table(table.name, records=batch, columns=list(columns))
+        size = COPY_BATCH
+    else:
+        async def flush(batch):
+            await connection.execute(table.insert(), [dict(zip(columns, row)) for row in batch])
+        size = INSERT_BATCH
+    batch, total = [], 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            await flush(batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        await flush(batch)
+        total += len(batch)
+    return total
+
+class Generator:
+    """Builds the dataset table by table, keeping only the columns later tables refer to."""
+
+    def __init__(self, counts: dict, seed: int, password: str):
+        self.counts = counts
+        self.rng = random.Random(seed)
+        self.password = password
+        self.now = datetime.datetime.utcnow().replace(microsecond=0)
+
+    def users(self):
+        n = self.counts["users"]
+        power = max(1, int(n * POWER_SELLER_SHARE))
+        self.user_ids = list(range(1, n + 1))
+        self.power_sellers = self.user_ids[:power]
+        # Power sellers are all verified; a fifth of everyone else is
+        self.verified = [i < power or self.rng.random() < 0.2 for i in range(n)]
+        self.seller_cum_weights = []
+        total = 0
+        for i in range(n):
+            total += POWER_SELLER_WEIGHT if i < power else 1
+            self.seller_cum_weights.append(total)
+        password_hash = get_password_hash(self.password)
+        joined = ascending_times(self.rng, n, self.now - datetime.timedelta(days=720), self.now)
+        for i, user_id in enumerate(self.user_ids):
+            yield (user_id, f"user{user_id}@example.com", password_hash, f"user{user_id}",
+                   self.verified[i], False, "en", joined[i])
+
+    def servers(self):
+        n = self.counts["servers"]
+        self.server_ids = list(range(1, n + 1))
+        self.server_cum_weights = zipf_cum_weights(n, 1.1)
+        self.server_chronicles = [CHRONICLES[i % len(CHRONICLES)] for i in range(n)]
+        # Each server trades around its own price level
+        self.server_prices = [round(self.rng.lognormvariate(0.4, 0.5), 2) for _ in range(n)]
+        for i, server_id in enumerate(self.server_ids):
+            yield (server_id, f"Server {server_id}", self.server_chronicles[i])
+
+    def profiles(self):
+        top_servers = ", ".join(f"Server {server_id}" for server_id in self.server_ids[:3])
+        for user_id in self.power_sellers:
+            yield (user_id, "Power seller", top_servers)
+
+    def listings(self):
+        n, rng = self.counts["listings"], self.rng
+        sellers = rng.choices(self.user_ids, cum_weights=self.seller_cum_weights, k=n)
+        servers = rng.choices(range(len(self.server_ids)), cum_weights=self.server_cum_weights, k=n)
+        created = ascending_times(rng, n, self.now - datetime.timedelta(days=180), self.now)
+        self.listing_sellers, self.listing_servers, self.listing_created = sellers, servers, created
+        self.listing_types, self.listing_prices, self.listing_quantities = [], [], []
+        self.active_listings = []
+        for i in range(n):
+            listing_type = "SELL" if rng.random() < 0.7 else "BUY"
+            # Asks sit above the server's reference price and bids below it, so seeded books never cross
+            spread = rng.uniform(1.0, 1.25) if listing_type == "SELL" else rng.uniform(0.75, 0.98)
+            price = round(self.server_prices[servers[i]] * spread, 2)
+            quantity = min(10_000_000, int(rng.lognormvariate(9, 1.2)) + 1)
+            active = rng.random() < 0.8
+            featured = active and rng.random() < 0.02
+            self.listing_types.append(listing_type)
+            self.listing_prices.append(price)
+            self.listing_quantities.append(quantity)
+            if active:
+                self.active_listings.append(i)
+            yield (i + 1, sellers[i], self.server_ids[servers[i]], self.server_chronicles[servers[i]], listing_type,
+                   quantity, price, rng.choice(DESCRIPTIONS), "ACTIVE" if active else "CLOSED", featured,
+                   self.now + datetime.timedelta(hours=rng.uniform(-24, 7 * 24)) if featured else None, created[i])
+
+    def purchases(self):
+        rng, n_listings = self.rng, self.counts["listings"]
+        self.purchase_rows = []
+        for purchase_id in range(1, self.counts["purchases"] + 1):
+            listing = rng.randrange(n_listings)
+            buyer = rng.choice(self.user_ids)
+            at = min(self.now, self.listing_created[listing] + datetime.timedelta(hours=rng.uniform(0, 72)))
+            self.purchase_rows.append((listing, buyer, at))
+            yield (purchase_id, buyer, listing + 1, at, "COMPLETED")
+
+    def reviews(self):
+        # The earliest purchases get reviewed, buyer reviewing the seller
+        rng = self.rng
+        self.review_ratings = {}
+        ratings = rng.choices(RATINGS, weights=RATING_WEIGHTS, k=self.counts["reviews"])
+        for review_id, ((listing, buyer, at), rating) in enumerate(zip(self.purchase_rows, ratings), start=1):
+            seller = self.listing_sellers[listing]
+            stats = self.review_ratings.setdefault(seller, [0, 0])
+            stats[0] += rating
+            stats[1] += 1
+            yield (review_id, listing + 1, buyer, seller, rating, None, min(self.now, at + datetime.timedelta(hours=rng.uniform(0, 48))))
+
+    def likes(self):
+        rng, target = self.rng, self.counts["likes"]
+        seen, self.likes_received = set(), {}
+        sellers = rng.choices(self.user_ids, cum_weights=self.seller_cum_weights, k=target * 2)
+        like_id = 0
+        for seller in sellers:
+            buyer = rng.choice(self.user_ids)
+            if buyer == seller or (buyer, seller) in seen:
+                continue
+            seen.add((buyer, seller))
+            self.likes_received[seller] = self.likes_received.get(seller, 0) + 1
+            like_id += 1
+            yield (like_id, buyer, seller, self.now - datetime.timedelta(days=rng.uniform(0, 180)))
+            if like_id >= target:
+                break
+
+    def seller_stats(self):
+        for seller in sorted(set(self.review_ratings) | set(self.likes_received)):
+            rating_sum, review_count = self.review_ratings.get(seller, (0, 0))
+            yield (seller, rating_sum, review_count, self.likes_received.get(seller, 0), self.now)
+
+    def messages(self):
+        rng = self.rng
+        candidates = self.active_listings or list(range(self.counts["listings"]))
+        rooms = {}
+        for _ in range(self.counts["rooms"]):
+            listing = rng.choice(candidates)
+            seller, buyer = self.listing_sellers[listing], rng.choice(self.user_ids)
+            if buyer != seller:
+                rooms[f"{listing + 1}_{buyer}_{seller}"] = (buyer, seller)
+        room_ids = list(rooms)
+        self.message_rows = []
+        if not room_ids:
+            return
+        # Busy rooms: message volume per room is Zipf distributed
+        picked = rng.choices(room_ids, cum_weights=zipf_cum_weights(len(room_ids)), k=self.counts["messages"])
+        created = ascending_times(rng, len(picked), self.now - datetime.timedelta(days=30), self.now)
+        for message_id, room_id in enumerate(picked, start=1):
+            buyer, seller = rooms[room_id]
+            sender = buyer if rng.random() < 0.5 else seller
+            self.message_rows.append({"id": message_id, "room_id": room_id, "sender_id": sender, "created_at": created[message_id - 1]})
+            yield (message_id, room_id, sender, f"message {message_id}", created[message_id - 1])
+
+    def chat_rooms(self):
+        for room in fold_chat_rooms(self.message_rows).values():
+            yield (room["room_id"], room["listing_id"], room["buyer_id"], room["seller_id"], room["last_message_id"],
+                   room["last_message_at"], room["buyer_unread"], room["seller_unread"])
+
+    def price_buckets(self):
+        def events():
+            # PriceEvent fields as plain tuples: building a million NamedTuples costs seconds
+            for i in range(self.counts["listings"]):
+                yield (self.server_ids[self.listing_servers[i]], self.listing_types[i], "listing",
+                       self.listing_prices[i], self.listing_quantities[i], self.listing_created[i])
+            for listing, buyer, at in self.purchase_rows:
+                yield (self.server_ids[self.listing_servers[listing]], self.listing_types[listing], "trade",
+                       self.listing_prices[listing], self.listing_quantities[listing], at)
+        for key, bucket in fold_price_events(events()).items():
+            yield (*key, *bucket)
+
+# Load order respects foreign keys; each step is (table, columns, generator method)
+STEPS = [
+    (User, ["id", "email", "password_hash", "username", "is_verified", "is_admin", "language", "created_at"], "users"),
+    (Server, ["id", "name", "chronicle"], "servers"),
+    (Profile, ["user_id", "description", "server_list"], "profiles"),
+    (Listing, ["id", "seller_id", "server_id", "chronicle", "type", "quantity", "price", "description", "status",
+               "is_featured", "featured_expires_at", "created_at"], "listings"),
+    (PurchaseHistory, ["id", "buyer_id", "listing_id", "transaction_date", "status"], "purchases"),
+    (Review, ["id", "listing_id", "reviewer_id", "reviewee_id", "rating", "comment", "created_at"], "reviews"),
+    (SellerLike, ["id", "buyer_id", "seller_id", "created_at"], "likes"),
+    (SellerStats, ["seller_id", "rating_sum", "review_count", "likes_count", "updated_at"], "seller_stats"),
+    (Message, ["id", "room_id", "sender_id", "content", "created_at"], "messages"),
+    (ChatRoom, ["room_id", "listing_id", "buyer_id", "seller_id", "last_message_id", "last_message_at",
+                "buyer_unread", "seller_unread"], "chat_rooms"),
+    (PriceBucket, ["server_id", "type", "source", "resolution", "bucket_start", "open", "high", "low", "close",
+                   "volume", "events", "first_event_at", "last_event_at"], "price_buckets"),
+]
+# Tables with serial ids whose sequences must move past the explicit ids (Postgres)
+SERIAL_TABLES = [User, Server, Listing, PurchaseHistory, Review, SellerLike, Message]
+
+async def reset(db):
+    if async_engine.dialect.name == "postgresql":
+        names = ", ".join(table.name for table in Base.metadata.sorted_tables)
+        await db.execute(text(f"TRUNCATE {names} RESTART IDENTITY CASCADE"))
+    else:
+        for table in reversed(Base.metadata.sorted_tables):
+            await db.execute(table.delete())
+
+async def seed(scale: float = 0.01, seed: int = 1, password: str = "password", reset_first: bool = False, log=None) -> dict:
+    """Generate and load the dataset; the database must be empty unless reset_first is set."""
+    counts = scaled_counts(scale)
+    generator = Generator(counts, seed, password)
+    async with async_engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    loaded = {}
+    async with AsyncSessionLocal() as db:
+        if reset_first:
+            await reset(db)
+        elif await db.scalar(select(User.id).limit(1)) is not None:
+            raise RuntimeError("Database already has users; pass reset_first (--reset) to replace them")
+        if async_engine.dialect.name == "postgresql":
+            # A bulk load can be replayed from scratch, so skip waiting for the WAL flush
+            await db.execute(text("SET LOCAL synchronous_commit TO off"))
+        for model, columns, method in STEPS:
+            started = time.perf_counter()
+            loaded[model.__tablename__] = await load_rows(db, model.__table__, columns, getattr(generator, method)())
+            if log:
+                log(f"{model.__tablename__}: {loaded[model.__tablename__]} rows in {time.perf_counter() - started:.1f}s")
+        await reconcile_server_stats(db)
+        if async_engine.dialect.name == "postgresql":
+            for model in SERIAL_TABLES:
+                await db.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{model.__tablename__}', 'id'), "
+                    f"(SELECT coalesce(max(id), 0) + 1 FROM {model.__tablename__}), false)"
+                ))
+        await db.commit()
+    if async_engine.dialect.name == "postgresql":
+        async with async_engine.connect() as connection:
+            connection = await connection.execution_options(isolation_level="AUTOCOMMIT")
+            await connection.execute(text("ANALYZE"))
+    return loaded
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic marketplace dataset")
+    parser.add_argument("--scale", type=float, default=0.01, help="1.0 is about a million listings")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--password", default="password", help="password shared by every generated user")
+    parser.add_argument("--reset", action="store_true", help="empty every table first")
+    args = parser.parse_args()
+    started = time.perf_counter()
+    log = lambda line: print(line, file=sys.stderr)
+    try:
+        asyncio.run(seed(args.scale, args.seed, args.password, args.reset, log))
+    except RuntimeError as e:
+        parser.exit(1, f"{e}\n")
+    log(f"Seeded scale {args.scale} in {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
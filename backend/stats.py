@@ -0,0 +1,228 @@
+from sqlalchemy import func, select, delete, insert, literal
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Iterable, NamedTuple, Optional, Tuple
+from database import dialect_insert
+from models import Listing, PurchaseHistory, ServerStats, ServerSellerStats, SellerStats, Server, User
+import datetime
+import os
+
+# Interval of the scheduled full recompute (run by the scheduler leader, see scheduler.py)
+SERVER_STATS_RECONCILE_SECONDS = float(os.getenv("SERVER_STATS_RECONCILE_SECONDS", "600"))
+
+def _qualifying_listings(server_ids: Optional[set]):
+    # Active listings whose seller is verified, optionally restricted to some servers
+    query = select(Listing.id, Listing.server_id, Listing.seller_id)\
+        .join(User, Listing.seller_id == User.id)\
+        .where(Listing.status == literal("ACTIVE", literal_execute=True))\
+        .where(User.is_verified == True)
+    if server_ids is not None:
+        query = query.where(Listing.server_id.in_(server_ids))
+    return query.subquery()
+
+async def _compute(db: AsyncSession, server_ids: Optional[set]) -> dict:
+    listings = _qualifying_listings(server_ids)
+    stats = {}
+    result = await db.execute(
+        select(listings.c.server_id, func.count(listings.c.id), func.count(func.distinct(listings.c.seller_id)))
+        .group_by(listings.c.server_id)
+    )
+    for server_id, active_listings, total_sellers in result.all():
+        stats[server_id] = [active_listings, 0, total_sellers]
+    result = await db.execute(
+        select(listings.c.server_id, func.count(PurchaseHistory.id))
+        .join(PurchaseHistory, PurchaseHistory.listing_id == listings.c.id)
+        .group_by(listings.c.server_id)
+    )
+    for server_id, total_transactions in result.all():
+        stats.setdefault(server_id, [0, 0, 0])[1] = total_transactions
+    return stats
+
+async def _store(db: AsyncSession, server_ids: Iterable[int], stats: dict):
+    now = datetime.datetime.utcnow()
+    rows = []
+    for server_id in server_ids:
+        active_listings, total_transactions, total_sellers = stats.get(server_id, (0, 0, 0))
+        rows.append({
+            "server_id": server_id,
+            "active_listings": active_listings,
+            "total_transactions": total_transactions,
+            "total_sellers": total_sellers,
+            "activity_score": active_listings + total_transactions,
+            "updated_at": now,
+        })
+    if not rows:
+        return
+    statement = dialect_insert(db)(ServerStats).values(rows)
+    statement = statement.on_conflict_do_update(
+        index_elements=[ServerStats.server_id],
+        set_={key: getattr(statement.excluded, key) for key in rows[0] if key != "server_id"},
+    )
+    await db.execute(statement)
+
+class ListingState(NamedTuple):
+    """The listing columns server stats depend on, captured before or after a write."""
+    id: int
+    server_id: Optional[int]
+    seller_id: int
+    status: str
+
+    @classmethod
+    def of(cls, listing: Listing) -> "ListingState":
+        return cls(listing.id, listing.server_id, listing.seller_id, listing.status)
+
+def _counted(state: Optional[ListingState], verified: set) -> bool:
+    # Mirrors _qualifying_listings
+    return state is not None and state.server_id is not None and state.status == "ACTIVE" and state.seller_id in verified
+
+async def _verified_sellers(db: AsyncSession, seller_ids: set) -> set:
+    if not seller_ids:
+        return set()
+    result = await db.execute(select(User.id).where(User.id.in_(seller_ids), User.is_verified == True))
+    return set(result.scalars().all())
+
+async def _apply_deltas(db: AsyncSession, server_deltas: dict):
+    # server_id -> [active_listings, total_transactions, total_sellers]; sorted so concurrent writers lock rows in one order
+    rows = [
+        {
+            "server_id": server_id,
+            "active_listings": listings,
+            "total_transactions": transactions,
+            "total_sellers": sellers,
+            "activity_score": listings + transactions,
+            "updated_at": datetime.datetime.utcnow(),
+        }
+        for server_id, (listings, transactions, sellers) in sorted(server_deltas.items())
+        if listings or transactions or sellers
+    ]
+    if not rows:
+        return
+    statement = dialect_insert(db)(ServerStats).values(rows)
+    # Increment in place so concurrent writers never lose an update
+    statement = statement.on_conflict_do_update(
+        index_elements=[ServerStats.server_id],
+        set_={
+            "active_listings": ServerStats.active_listings + statement.excluded.active_listings,
+            "total_transactions": ServerStats.total_transactions + statement.excluded.total_transactions,
+            "total_sellers": ServerStats.total_sellers + statement.excluded.total_sellers,
+            "activity_score": ServerStats.activity_score + statement.excluded.activity_score,
+            "updated_at": statement.excluded.updated_at,
+        },
+    )
+    await db.execute(statement)
+
+async def _apply_changes(db: AsyncSession, changes: list, verified_before: set, verified_after: set):
+    server_deltas = {}
+    seller_deltas = {}
+    moved = []
+    for before, after in changes:
+        counted_before = before if _counted(before, verified_before) else None
+        counted_after = after if _counted(after, verified_after) else None
+        if counted_before is not None and counted_after is not None \
+                and (counted_before.server_id, counted_before.seller_id) == (counted_after.server_id, counted_after.seller_id):
+            continue
+        for state, sign in ((counted_before, -1), (counted_after, 1)):
+            if state is None:
+                continue
+            key = (state.server_id, state.seller_id)
+            seller_deltas[key] = seller_deltas.get(key, 0) + sign
+            server_deltas.setdefault(state.server_id, [0, 0, 0])[0] += sign
+            # New listings have no purchases yet
+            if before is not None:
+                moved.append((state.id, state.server_id, sign))
+    if moved:
+        # Purchases count toward a server only while their listing does
+        result = await db.execute(
+            select(PurchaseHistory.listing_id, func.count(PurchaseHistory.id))
+            .where(PurchaseHistory.listing_id.in_({listing_id for listing_id, _, _ in moved}))
+            .group_by(PurchaseHistory.listing_id)
+        )
+        purchases = dict(result.all())
+        for listing_id, server_id, sign in moved:
+            server_deltas[server_id][1] += sign * purchases.get(listing_id, 0)
+    rows = [
+        {"server_id": server_id, "seller_id": seller_id, "active_listings": delta}
+        for (server_id, seller_id), delta in sorted(seller_deltas.items()) if delta
+    ]
+    if rows:
+        statement = dialect_insert(db)(ServerSellerStats).values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=[ServerSellerStats.server_id, ServerSellerStats.seller_id],
+            set_={"active_listings": ServerSellerStats.active_listings + statement.excluded.active_listings},
+        ).returning(ServerSellerStats.server_id, ServerSellerStats.seller_id, ServerSellerStats.active_listings)
+        # A seller counts toward a server while they have at least one counted listing there
+        for server_id, seller_id, active_listings in (await db.execute(statement)).all():
+            previous = active_listings - seller_deltas[(server_id, seller_id)]
+            server_deltas[server_id][2] += (active_listings > 0) - (previous > 0)
+        await db.execute(delete(ServerSellerStats).where(
+            ServerSellerStats.server_id.in_({row["server_id"] for row in rows}),
+            ServerSellerStats.active_listings <= 0,
+        ))
+    await _apply_deltas(db, server_deltas)
+
+async def apply_listing_changes(db: AsyncSession, changes: Iterable[Tuple[Optional[ListingState], Optional[ListingState]]]):
+    """Apply (before, after) listing states to the server stats inside the caller's transaction.
+
+    before is None for a created listing and after is None for a deleted one. Call it while
+    the listings' purchases still exist.
+    """
+    changes = list(changes)
+    sellers = {state.seller_id for change in changes for state in change if state is not None}
+    verified = await _verified_sellers(db, sellers)
+    await _apply_changes(db, changes, verified, verified)
+
+async def apply_seller_verification(db: AsyncSession, seller_id: int, verified: bool):
+    """Move a seller's active listings in or out of the server stats before their is_verified
+    changes; deleting the user counts as losing verification."""
+    result = await db.execute(
+        select(Listing.id, Listing.server_id, Listing.seller_id, Listing.status)
+        .where(Listing.seller_id == seller_id, Listing.status == literal("ACTIVE", literal_execute=True))
+    )
+    states = [ListingState(*row) for row in result.all()]
+    verified_before = await _verified_sellers(db, {seller_id})
+    await _apply_changes(db, [(state, state) for state in states], verified_before, {seller_id} if verified else set())
+
+async def apply_purchase(db: AsyncSession, listing: Optional[Listing]):
+    """Count a new purchase of a listing inside the caller's transaction."""
+    if listing is None:
+        return
+    state = ListingState.of(listing)
+    if _counted(state, await _verified_sellers(db, {state.seller_id})):
+        await _apply_deltas(db, {state.server_id: [0, 1, 0]})
+
+async def reconcile_server_stats(db: AsyncSession):
+    """Full recompute for every server; repairs drift from concurrent incremental updates."""
+    server_ids = (await db.execute(select(Server.id))).scalars().all()
+    stats = await _compute(db, None)
+    await _store(db, server_ids, stats)
+    await db.execute(delete(ServerStats).where(ServerStats.server_id.notin_(select(Server.id))))
+    listings = _qualifying_listings(None)
+    await db.execute(delete(ServerSellerStats))
+    await db.execute(insert(ServerSellerStats).from_select(
+        ["server_id", "seller_id", "active_listings"],
+        select(listings.c.server_id, listings.c.seller_id, func.count(listings.c.id))
+        .where(listings.c.server_id.isnot(None))
+        .group_by(listings.c.server_id, listings.c.seller_id),
+    ))
+
+async def adjust_seller_stats(db: AsyncSession, seller_id: Optional[int], rating_sum: int = 0, review_count: int = 0, likes_count: int = 0):
+    """Apply counter deltas for a seller inside the caller's transaction."""
+    if seller_id is None:
+        return
+    statement = dialect_insert(db)(SellerStats).values(
+        seller_id=seller_id,
+        rating_sum=rating_sum,
+        review_count=review_count,
+        likes_count=likes_count,
+        updated_at=datetime.datetime.utcnow(),
+    )
+    # Increment in place so concurrent writers never lose an update
+    statement = statement.on_conflict_do_update(
+        index_elements=[SellerStats.seller_id],
+        set_={
+            "rating_sum": SellerStats.rating_sum + statement.excluded.rating_sum,
+            "review_count": SellerStats.review_count + statement.excluded.review_count,
+            "likes_count": SellerStats.likes_count + statement.excluded.likes_count,
+            "updated_at": statement.excluded.updated_at,
+        },
+    )
+    await db.execute(statement)
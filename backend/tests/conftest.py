@@ -0,0 +1,7 @@
+import os
+import sys
+import tempfile
+
+# The app modules build their engines at import time; point them at a scratch SQLite file
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.gettempdir(), "l2_adena_tests.db"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,54 @@
+import asyncio
+import datetime
+import time
+from types import SimpleNamespace
+
+from auth import invalidate_principal, principal_cache, resolve_principal, token_claims
+
+class FakeSession:
+    """Counts primary-key lookups and serves one user row."""
+
+    def __init__(self, user):
+        self.user = user
+        self.gets = 0
+
+    async def get(self, model, user_id):
+        self.gets += 1
+        return self.user if user_id == self.user.id else None
+
+def make_user(user_id: int, **changes):
+    fields = dict(id=user_id, email=f"u{user_id}@example.com", username=f"u{user_id}", is_verified=False,
+                  is_admin=False, language="en", created_at=datetime.datetime(2026, 1, 1))
+    fields.update(changes)
+    return SimpleNamespace(**fields)
+
+def test_fresh_token_resolves_without_the_database():
+    user = make_user(9001, is_verified=True, language="es")
+    db = FakeSession(user)
+    principal = asyncio.run(resolve_principal(token_claims(user), db))
+    assert db.gets == 0
+    assert (principal.id, principal.is_verified, principal.language, principal.username) == (9001, True, "es", "u9001")
+
+def test_invalidation_outranks_older_claims():
+    user = make_user(9002)
+    payload = token_claims(user)
+    payload["iat"] -= 1
+    user.is_verified = True
+    invalidate_principal(user.id)
+    db = FakeSession(user)
+    assert asyncio.run(resolve_principal(payload, db)).is_verified
+    assert db.gets == 1
+    # Served from the cache afterwards
+    assert asyncio.run(resolve_principal(payload, db)).is_verified and db.gets == 1
+    principal_cache.invalidate(user.id)
+
+def test_old_or_legacy_tokens_fall_back_to_the_database():
+    user = make_user(9003)
+    db = FakeSession(user)
+    old = {**token_claims(user), "iat": int(time.time()) - 3600}
+    legacy = {"sub": user.email, "uid": user.id}
+    asyncio.run(resolve_principal(old, db))
+    principal_cache.invalidate(user.id)
+    asyncio.run(resolve_principal(legacy, db))
+    assert db.gets == 2
+    principal_cache.invalidate(user.id)
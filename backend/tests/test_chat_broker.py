@@ -0,0 +1,92 @@
+import asyncio
+
+import fakeredis
+
+from chat import PostgresBroker, RedisBroker
+
+class Inbox:
+    def __init__(self):
+        self.rooms = []
+        self.channel = []
+
+    async def deliver(self, room_id: str, message: str):
+        self.rooms.append((room_id, message))
+
+    async def handle(self, message: str):
+        self.channel.append(message)
+
+async def wait_for(condition, timeout: float = 2.0):
+    for _ in range(int(timeout / 0.02)):
+        if condition():
+            return
+        await asyncio.sleep(0.02)
+
+def test_redis_brokers_fan_out_across_instances():
+    async def run():
+        server = fakeredis.FakeServer()
+        brokers = [RedisBroker(client=fakeredis.aioredis.FakeRedis(server=server)) for _ in range(2)]
+        inboxes = [Inbox(), Inbox()]
+        for broker, inbox in zip(brokers, inboxes):
+            await broker.start(inbox.deliver)
+            await broker.subscribe("1_2_3")
+            await broker.listen("order_book", inbox.handle)
+        await asyncio.sleep(0.2)
+        await brokers[0].publish("1_2_3", "hello")
+        await brokers[0].publish("4_5_6", "nobody subscribed")
+        await brokers[0].notify("order_book", "delta")
+        await wait_for(lambda: inboxes[1].rooms and inboxes[1].channel)
+        # Give a duplicate (echo of the sender's own message) time to show up
+        await asyncio.sleep(0.2)
+        for broker in brokers:
+            await broker.stop()
+        return inboxes
+
+    sender, receiver = asyncio.run(run())
+    # The sender delivers locally once and drops its own message coming back from Redis
+    assert sender.rooms == [("1_2_3", "hello"), ("4_5_6", "nobody subscribed")]
+    assert receiver.rooms == [("1_2_3", "hello")]
+    # Internal channels never reach the sender, nor any chat room
+    assert sender.channel == [] and receiver.channel == ["delta"]
+
+class FakeNotify:
+    """In-process stand-in for pg_notify and asyncpg listeners, shared by several brokers."""
+
+    def __init__(self):
+        self.listeners = []
+
+    async def execute(self, query: str, channel: str, payload: str):
+        for listen_channel, callback in list(self.listeners):
+            if listen_channel == channel:
+                callback(None, 0, channel, payload)
+
+    async def add_listener(self, channel, callback):
+        self.listeners.append((channel, callback))
+
+def postgres_broker(notify: FakeNotify, inbox: Inbox) -> PostgresBroker:
+    broker = PostgresBroker("postgresql://localhost/test")
+    broker._deliver = inbox.deliver
+    broker._pool = broker._listener = notify
+    notify.listeners.append((broker.channel, broker._on_notify))
+    return broker
+
+def test_postgres_brokers_fan_out_across_instances():
+    async def run():
+        notify = FakeNotify()
+        inboxes = [Inbox(), Inbox(), Inbox()]
+        brokers = [postgres_broker(notify, inbox) for inbox in inboxes]
+        for broker, inbox in zip(brokers, inboxes):
+            await broker.listen("order_book", inbox.handle)
+        await brokers[1].subscribe("1_2_3")
+        await brokers[0].publish("1_2_3", "hello")
+        await brokers[0].notify("order_book", "delta")
+        await brokers[0].notify("order_book", "x" * 8000)
+        await asyncio.sleep(0.05)
+        return inboxes, brokers[0].fits("x" * 8000)
+
+    (sender, subscribed, other), fits = asyncio.run(run())
+    assert sender.rooms == [("1_2_3", "hello")]
+    assert subscribed.rooms == [("1_2_3", "hello")]
+    # Rooms are filtered in-process: a worker without sockets in the room ignores it
+    assert other.rooms == []
+    assert sender.channel == [] and subscribed.channel == ["delta"] and other.channel == ["delta"]
+    assert not fits
@@ -0,0 +1,87 @@
+import asyncio
+import collections
+import datetime
+import itertools
+import time
+
+import pytest
+
+from chat import MessageWriter, WriterBacklogFull
+
+def write_behind_writer(**options) -> MessageWriter:
+    writer = MessageWriter(**options)
+    writer.write_behind = True
+    return writer
+
+def fake_reservations(writer: MessageWriter, counter, delay: float = 0.0) -> list:
+    """Replace the sequence round trip with ids from `counter`; returns the list of reservations."""
+    calls = []
+
+    async def reserve():
+        await asyncio.sleep(delay)
+        calls.append(1)
+        writer._ids = collections.deque(next(counter) for _ in range(writer.id_block_size))
+        writer._ids_reserved_at = time.monotonic()
+
+    writer._reserve_ids = reserve
+    return calls
+
+def test_ids_come_from_reserved_blocks():
+    writer = write_behind_writer(id_block_size=3, id_block_max_age=60)
+    calls = fake_reservations(writer, itertools.count(1))
+
+    async def run():
+        return [(await writer.submit("1_2_3", 2, "hi"))["id"] for _ in range(7)]
+
+    assert asyncio.run(run()) == [1, 2, 3, 4, 5, 6, 7]
+    assert len(calls) == 3
+
+def test_stale_block_is_dropped():
+    writer = write_behind_writer(id_block_size=3, id_block_max_age=0.05)
+    fake_reservations(writer, itertools.count(1))
+
+    async def run():
+        first = (await writer.submit("1_2_3", 2, "hi"))["id"]
+        await asyncio.sleep(0.1)
+        return first, (await writer.submit("1_2_3", 2, "hi"))["id"]
+
+    assert asyncio.run(run()) == (1, 4)
+
+def test_concurrent_submits_respect_buffer_limit():
+    writer = write_behind_writer(id_block_size=10, buffer_limit=2)
+    fake_reservations(writer, itertools.count(1), delay=0.01)
+
+    async def run():
+        return await asyncio.gather(*(writer.submit("1_2_3", 2, "hi") for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert sum(isinstance(result, WriterBacklogFull) for result in results) == 1
+    assert writer.pending == 2 and writer.rejected == 1
+
+def test_settled_holds_back_recent_messages():
+    writer = write_behind_writer(id_block_max_age=1, flush_interval=0.05, max_retries=3)
+    now = datetime.datetime.utcnow()
+    old, recent = now - datetime.timedelta(seconds=5), now
+    page = [{"id": 1, "created_at": old}, {"id": 2, "created_at": old}, {"id": 3, "created_at": recent}, {"id": 4, "created_at": old}]
+    assert writer.settle_seconds == pytest.approx(1.2)
+    # Everything from the first unsettled message on waits for the next poll
+    assert [message["id"] for message in writer.settled(page)] == [1, 2]
+
+def test_write_through_has_no_settle_window():
+    writer = MessageWriter()
+    page = [{"id": 1, "created_at": datetime.datetime.utcnow()}]
+    assert writer.settle_seconds == 0 and writer.commit_window == 0
+    assert writer.settled(page) == page
+
+def test_pending_since_overlaps_the_cursor():
+    writer = write_behind_writer()
+    since_at = datetime.datetime.utcnow()
+    writer._buffer = [
+        {"id": 5, "room_id": "1_2_3", "created_at": since_at - datetime.timedelta(seconds=1)},
+        {"id": 6, "room_id": "1_2_3", "created_at": since_at + datetime.timedelta(seconds=1)},
+        {"id": 12, "room_id": "1_2_3", "created_at": since_at},
+        {"id": 13, "room_id": "4_5_6", "created_at": since_at},
+    ]
+    # Message 6 came from an older id block but was sent after message 10, the client's cursor
+    assert [m["id"] for m in writer.pending_since("1_2_3", 10, since_at)] == [6, 12]
+    assert [m["id"] for m in writer.pending_since("1_2_3", 10)] == [12]
@@ -0,0 +1,90 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import fakeredis
+
+from chat import ConnectionManager, RedisBroker
+from orderbook import OrderBook, ORDER_BOOK_CHANNEL
+
+def listing(listing_id: int, server_id: int = 1, type: str = "SELL", price: float = 1.5, quantity: int = 10, status: str = "ACTIVE"):
+    return SimpleNamespace(id=listing_id, server_id=server_id, type=type, price=price, quantity=quantity, status=status)
+
+async def settle(condition, timeout: float = 2.0):
+    for _ in range(int(timeout / 0.02)):
+        if condition():
+            return
+        await asyncio.sleep(0.02)
+
+def test_changes_reach_other_workers_over_the_chat_broker():
+    async def run():
+        server = fakeredis.FakeServer()
+        managers = [ConnectionManager(RedisBroker(client=fakeredis.aioredis.FakeRedis(server=server))) for _ in range(2)]
+        books = [OrderBook(manager.broker) for manager in managers]
+        for manager, book in zip(managers, books):
+            await manager.start()
+            await book.start()
+        await asyncio.sleep(0.2)
+        for i in range(150):
+            books[0].apply(listing(i, type="SELL" if i % 2 else "BUY", price=1.0 + i % 5))
+        books[1].apply(listing(500, server_id=2, price=3.0))
+        books[0].remove(3)
+        await settle(lambda: books[0].entries == books[1].entries)
+        snapshots = books[0].snapshot(1), books[1].snapshot(1)
+        stats = books[0].stats(), books[1].stats()
+        for manager, book in zip(managers, books):
+            await book.stop()
+            await manager.stop()
+        return books, snapshots, stats
+
+    books, snapshots, stats = asyncio.run(run())
+    assert books[0].entries == books[1].entries and len(books[0].entries) == 150
+    assert snapshots[0] == snapshots[1]
+    # Each worker applies only the other's changes, never its own echoed back
+    assert stats[0]["received"] == 1 and stats[1]["received"] == 151
+
+class SmallBroker:
+    """Stand-in broker with a tiny payload limit that records what it was asked to send."""
+
+    def __init__(self, max_payload: int):
+        self.max_payload = max_payload
+        self.sent = []
+
+    async def listen(self, channel, handler):
+        pass
+
+    def fits(self, message: str) -> bool:
+        return len(message) <= self.max_payload
+
+    async def notify(self, channel: str, message: str):
+        self.sent.append((channel, message))
+
+def test_oversized_batches_are_split():
+    broker = SmallBroker(max_payload=200)
+    book = OrderBook(broker)
+
+    async def run():
+        await book.start()
+        for i in range(20):
+            book.apply(listing(i))
+        await book.stop()
+
+    asyncio.run(run())
+    assert len(broker.sent) > 1 and all(len(message) <= 200 for _, message in broker.sent)
+    assert all(channel == ORDER_BOOK_CHANNEL for channel, _ in broker.sent)
+    assert sorted(change[0] for _, message in broker.sent for change in json.loads(message)["changes"]) == list(range(20))
+    assert book.published == 20
+
+def test_malformed_updates_are_ignored():
+    book = OrderBook()
+    book.apply(listing(1))
+
+    async def run():
+        for message in ("not json", json.dumps({"changes": [[2, [1, "HOLD", 1.0, 5]]]}),
+                        json.dumps({"changes": [[2, [1, "SELL"]]]}), json.dumps({"other": []}),
+                        json.dumps({"changes": [[2, ["1", "SELL", 1.0, 5]]]})):
+            await book._receive(message)
+        await book._receive(json.dumps({"changes": [[2, [1, "BUY", 1.2, 5]], [1, None]]}))
+
+    asyncio.run(run())
+    assert book.entries == {2: (1, "BUY", 1.2, 5)} and book.received == 2
@@ -0,0 +1,12 @@
+import datetime
+
+from pricehistory import PriceEvent, fold_price_events
+
+def test_fold_tracks_event_times_in_time_order():
+    at = datetime.datetime(2026, 10, 18, 12, 0, 30)
+    later = at + datetime.timedelta(seconds=10)
+    buckets = fold_price_events([
+        PriceEvent(1, "SELL", "trade", 9.0, 2, later),
+        PriceEvent(1, "SELL", "trade", 7.0, 1, at),
+    ])
+    assert buckets[(1, "SELL", "trade", "1m", at.replace(second=0))] == [7.0, 9.0, 7.0, 9.0, 3, 2, at, later]
@@ -0,0 +1,12 @@
+from response_cache import etag_matches
+
+def test_etag_matches_exact_tags_only():
+    etag = '"abc"'
+    assert etag_matches(etag, '"abc"')
+    assert etag_matches(etag, 'W/"abc"')
+    assert etag_matches(etag, '"x", W/"abc" ')
+    assert etag_matches(etag, "*")
+    assert not etag_matches(etag, "")
+    assert not etag_matches(etag, '"abcd"')
+    assert not etag_matches(etag, '"xabc", "ab"')
+    assert not etag_matches(etag, 'abc')